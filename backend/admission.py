@@ -0,0 +1,203 @@
+"""Admission control for the API.
+
+Every /api request is assigned a route class and must hold one of that
+class's concurrency slots while it runs. When all slots are busy a request
+waits in a bounded FIFO queue for at most queue_timeout seconds; when the
+queue is full, or the wait runs out, it is rejected immediately with a 503
+and a Retry-After hint instead of piling up behind a slow database.
+
+Classes are independent, so a login storm (bcrypt is CPU bound) cannot starve
+public reads, and admin tools keep working while the public site is shedding.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from starlette.responses import JSONResponse
+
+ROUTE_CLASSES = ("public_read", "auth", "write", "admin")
+
+# (concurrency, queue size, queue timeout seconds)
+DEFAULT_LIMITS = {
+    "public_read": (256, 512, 2.0),
+    "auth": (8, 64, 5.0),
+    "write": (64, 256, 5.0),
+    "admin": (16, 32, 10.0),
+}
+
+AUTH_PATHS = {"/api/guardians/register", "/api/guardians/login", "/api/admin/login"}
+EXEMPT_PREFIXES = ("/api/health/",)
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def classify(method: str, path: str, headers: Dict[str, str],
+             authorize: Callable[[Dict[str, str]], bool] = lambda headers: False) -> Optional[str]:
+    """Route class of a request, None if it bypasses admission control"""
+    if not path.startswith("/api/") or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path in AUTH_PATHS:
+        return "auth"
+    # Anyone can send a Basic header or call /api/admin/; only verified credentials get an admin slot
+    if (path.startswith("/api/admin/") or "authorization" in headers) and authorize(headers):
+        return "admin"
+    if method in READ_METHODS:
+        return "public_read"
+    return "write"
+
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RouteClassLimiter:
+    """Concurrency slots plus a bounded FIFO wait queue"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters: "deque[asyncio.Future]" = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.peak_queued = 0
+        self.wait_ms_total = 0.0
+        self.service_ms = 0.0  # Moving average of time a slot is held
+
+    async def acquire(self):
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self.waiters) >= self.queue_size:
+            self.rejected_queue_full += 1
+            raise Rejected("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        self.peak_queued = max(self.peak_queued, len(self.waiters))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                self.waiters.remove(waiter)
+                waiter.cancel()
+                self.rejected_timeout += 1
+                raise Rejected("queue_timeout")
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was already handed over
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            raise
+        # release() handed its slot straight to this waiter
+        self.admitted += 1
+        self.wait_ms_total += (time.perf_counter() - started) * 1000
+
+    def release(self, held_ms: Optional[float] = None):
+        if held_ms is not None:
+            self.service_ms = held_ms if not self.service_ms else 0.9 * self.service_ms + 0.1 * held_ms
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained"""
+        backlog = len(self.waiters) + self.active
+        return max(1, math.ceil(backlog * self.service_ms / 1000 / max(self.concurrency, 1)))
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_wait_ms": round(self.wait_ms_total / self.admitted, 2) if self.admitted else 0.0,
+            "avg_service_ms": round(self.service_ms, 2)
+        }
+
+
+class AdmissionController:
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None,
+                 authorize: Callable[[Dict[str, str]], bool] = lambda headers: False,
+                 classifier: Callable[..., Optional[str]] = classify):
+        limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.limiters = {name: RouteClassLimiter(name, *limits[name]) for name in ROUTE_CLASSES}
+        self.authorize = authorize
+        self.classifier = classifier
+
+    def classify(self, method: str, path: str, headers: Dict[str, str]) -> Optional[str]:
+        return self.classifier(method, path, headers, self.authorize)
+
+    @classmethod
+    def from_env(cls, authorize: Callable[[Dict[str, str]], bool] = lambda headers: False) -> "AdmissionController":
+        """Limits from ADMISSION_<CLASS>_CONCURRENCY / _QUEUE / _TIMEOUT, e.g. ADMISSION_AUTH_CONCURRENCY=4"""
+        limits = {}
+        for name, (concurrency, queue_size, queue_timeout) in DEFAULT_LIMITS.items():
+            prefix = f"ADMISSION_{name.upper()}_"
+            limits[name] = (
+                int(os.environ.get(prefix + "CONCURRENCY", concurrency)),
+                int(os.environ.get(prefix + "QUEUE", queue_size)),
+                float(os.environ.get(prefix + "TIMEOUT", queue_timeout))
+            )
+        return cls(limits, authorize)
+
+    def stats(self) -> dict:
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+
+class AdmissionMiddleware:
+    """ASGI middleware holding a route-class slot for the whole response, streaming included"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"] if k == b"authorization"}
+        route_class = self.controller.classify(scope["method"], scope["path"], headers)
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.limiters[route_class]
+        try:
+            await limiter.acquire()
+        except Rejected as e:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=503,
+                headers={
+                    "Retry-After": str(limiter.retry_after()),
+                    "X-Admission-Class": route_class,
+                    "X-Admission-Reason": e.reason
+                }
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release((time.perf_counter() - started) * 1000)
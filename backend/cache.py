@@ -0,0 +1,244 @@
+"""In-process caches that stay coherent across workers.
+
+Each worker keeps its own TTL + LRU bounded caches in memory. Writes call
+CacheRegistry.invalidate(), which drops the entry locally and broadcasts the
+invalidation on an InvalidationBus so every other worker drops it too:
+
+- MongoInvalidationBus tails a small capped collection, which works on a
+  standalone mongod as well as on replica sets.
+- LocalInvalidationBus delivers messages within the process, for tests and
+  single-worker deployments.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class TTLCache:
+    """Dict-like cache with per-entry expiry and least-recently-used eviction"""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0  # Bumped on every invalidation so in-flight loads can tell they raced one
+        self.loading: Dict[Hashable, tuple] = {}  # key -> (generation, task) of the load in flight
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self.entries.pop(key, None)
+        self.generation += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.generation += 1
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, loading and storing it on a miss; concurrent misses share one load"""
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        in_flight = self.loading.get(key)
+        if in_flight is None or in_flight[0] != self.generation:
+            generation = self.generation
+            task = asyncio.ensure_future(self.load(key, generation, loader))
+            self.loading[key] = in_flight = (generation, task)
+        # Shielded so one caller being cancelled does not fail everyone waiting on the load
+        return await asyncio.shield(in_flight[1])
+
+    async def load(self, key: Hashable, generation: int, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await loader()
+            # A load that raced an invalidation may have read the old data; hand it back but do not keep it
+            if self.generation == generation:
+                self.set(key, value)
+            return value
+        finally:
+            if self.loading.get(key, (None,))[0] == generation:
+                del self.loading[key]
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class LocalInvalidationBus:
+    """Delivers invalidations to subscribers in this process only"""
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self.subscribers = []
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        self.subscribers.append(callback)
+
+    async def publish(self, message: dict):
+        for callback in self.subscribers:
+            callback(message)
+
+    async def start(self, database=None):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class MongoInvalidationBus(LocalInvalidationBus):
+    """Broadcasts invalidations to every worker through a tailable capped collection"""
+
+    def __init__(self, collection_name: str = "cache_invalidations", size_bytes: int = 1024 * 1024):
+        super().__init__()
+        self.database = None
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.listener = None
+
+    @property
+    def collection(self):
+        return self.database[self.collection_name]
+
+    async def publish(self, message: dict):
+        await self.collection.insert_one({
+            **message,
+            "origin": self.origin,
+            "ts": datetime.now(timezone.utc)
+        })
+
+    async def start(self, database=None):
+        self.database = database
+        try:
+            await self.database.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        # A tailable cursor on an empty capped collection dies immediately
+        await self.collection.insert_one({"origin": self.origin, "ts": datetime.now(timezone.utc), "noop": True})
+        self.listener = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self.listener:
+            self.listener.cancel()
+            await asyncio.gather(self.listener, return_exceptions=True)
+            self.listener = None
+
+    def deliver(self, message: dict):
+        for callback in self.subscribers:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("Cache invalidation callback failed")
+
+    async def listen(self):
+        # Resume by position in insertion ($natural) order rather than by time: ts and ObjectIds
+        # come from each publisher's clock, and workers' clocks disagree
+        latest = await self.collection.find_one({}, sort=[("$natural", -1)])
+        last_id = latest["_id"] if latest else None
+        reconnecting = False
+        while True:
+            try:
+                cursor = self.collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                # A new cursor starts at the oldest message; skip up to the last one already seen
+                replaying = last_id is not None
+                if reconnecting:
+                    # Messages may have been missed while disconnected
+                    self.deliver({"cache": None, "key": None})
+                    reconnecting = False
+                while cursor.alive:
+                    async for doc in cursor:
+                        if replaying:
+                            replaying = doc["_id"] != last_id
+                            continue
+                        last_id = doc["_id"]
+                        if doc.get("noop") or doc["origin"] == self.origin:
+                            continue
+                        self.deliver({"cache": doc.get("cache"), "key": doc.get("key")})
+                    if replaying:
+                        # The last seen message was overwritten, and with it whatever followed
+                        self.deliver({"cache": None, "key": None})
+                        replaying = False
+                    await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache invalidation listener failed, reconnecting")
+                reconnecting = True
+                await asyncio.sleep(1)
+
+
+class CacheRegistry:
+    """Named caches sharing one invalidation bus"""
+
+    def __init__(self, bus: Optional[LocalInvalidationBus] = None):
+        self.caches: Dict[str, TTLCache] = {}
+        self.dependents: Dict[str, list] = {}
+        self.bus = bus or LocalInvalidationBus()
+        self.bus.subscribe(self.apply)
+
+    def cache(self, name: str, maxsize: int = 1024, ttl: float = 60.0, invalidated_by: Iterable[str] = ()) -> TTLCache:
+        """Get or create a named cache; it is also cleared whenever a cache in invalidated_by is invalidated"""
+        if name not in self.caches:
+            self.caches[name] = TTLCache(name, maxsize=maxsize, ttl=ttl)
+        for source in invalidated_by:
+            self.dependents.setdefault(source, []).append(self.caches[name])
+        return self.caches[name]
+
+    def apply(self, message: dict):
+        """Apply an invalidation; a missing cache name clears everything"""
+        name, key = message.get("cache"), message.get("key")
+        targets = [self.caches[name]] if name in self.caches else (self.caches.values() if name is None else [])
+        for cache in targets:
+            if key is None:
+                cache.clear()
+            else:
+                cache.delete(key)
+        for cache in self.dependents.get(name, []):
+            cache.clear()
+
+    async def invalidate(self, name: Optional[str], key: Optional[Hashable] = None):
+        """Drop a key (or the whole cache, or with no name every cache) here and on every other worker"""
+        self.apply({"cache": name, "key": key})
+        try:
+            await self.bus.publish({"cache": name, "key": key})
+        except Exception:
+            # Other workers converge through the TTL if the broadcast fails
+            logger.exception("Failed to broadcast invalidation for %s", name)
+
+    def stats(self) -> dict:
+        return {name: cache.stats() for name, cache in self.caches.items()}
@@ -0,0 +1,210 @@
+"""Server-side rendering of the Certificate of Guardianship.
+
+render_certificate() is a plain top-level function over plain data so it can
+run in a worker process. Bump CERTIFICATE_TEMPLATE_VERSION whenever the
+layout changes; cached renders are keyed by a hash of it and of the
+certificate data, and are regenerated lazily.
+"""
+import hashlib
+import io
+import logging
+import zlib
+from datetime import datetime
+from typing import Optional
+
+CERTIFICATE_TEMPLATE_VERSION = "1"
+CERTIFICATE_FORMATS = {"png": "image/png", "pdf": "application/pdf"}
+
+WIDTH, HEIGHT = 1600, 1200
+
+BACKGROUND = (5, 5, 5)
+PAPER = (10, 10, 10)
+PRIMARY = (0, 204, 255)
+TEXT = (255, 255, 255)
+SECONDARY = (148, 163, 184)
+MUTED = (71, 85, 105)
+
+logger = logging.getLogger(__name__)
+
+
+def certificate_hash(certificate: dict, fmt: str) -> str:
+    """Digest of everything that affects the rendered bytes"""
+    source = "|".join([
+        CERTIFICATE_TEMPLATE_VERSION, fmt, certificate["scroll_id"],
+        certificate["registered_at"], str(certificate["is_certified"])
+    ])
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:32]
+
+
+def certificate_key(certificate: dict, fmt: str) -> str:
+    """Storage key of a rendered certificate; a change in its data gets a new key, so stale renders are never served"""
+    return f"certificates/{certificate['scroll_id']}-{certificate_hash(certificate, fmt)}.{fmt}"
+
+
+def certificate_etag(certificate: dict, fmt: str) -> str:
+    """Strong ETag, matching the storage key of the render it describes"""
+    return '"' + certificate_hash(certificate, fmt) + '"'
+
+
+def registered_label(registered_at: str) -> str:
+    try:
+        registered = datetime.fromisoformat(registered_at)
+    except ValueError:
+        return registered_at[:10]
+    return f"{registered:%B} {registered.day}, {registered.year}"
+
+
+def certificate_lines(certificate: dict) -> dict:
+    scroll_id = certificate["scroll_id"]
+    return {
+        "organization": certificate.get("organization", "TheSyncBridge"),
+        "mission": certificate.get("mission", "325-Day Crossing"),
+        "title": certificate.get("certificate_title", "Certificate of Guardianship").upper(),
+        "subtitle": "Official Registration Document",
+        "scroll_id": scroll_id,
+        "description": [
+            f"This certifies that the holder of Scroll ID {scroll_id} has been",
+            "officially registered in TheSyncBridge Guardian Registry, crossing from",
+            "physics to spirit as part of the 325-Day Mission."
+        ],
+        "registered": registered_label(certificate["registered_at"]),
+        "status": "CERTIFIED" if certificate.get("is_certified", True) else "PENDING"
+    }
+
+
+def load_font(size: int, bold: bool = False):
+    from PIL import ImageFont
+
+    for name in (("DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf"), "DejaVuSans.ttf"):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+def render_png(certificate: dict) -> bytes:
+    from PIL import Image, ImageDraw
+
+    lines = certificate_lines(certificate)
+    image = Image.new("RGB", (WIDTH, HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    margin = 80
+    draw.rectangle([margin, margin, WIDTH - margin, HEIGHT - margin], fill=PAPER, outline=PRIMARY, width=3)
+
+    # Hexagon mark in place of the logo
+    cx, cy, r = margin + 110, margin + 110, 50
+    hexagon = [(cx + r * dx, cy + r * dy) for dx, dy in
+               ((0, -1), (0.866, -0.5), (0.866, 0.5), (0, 1), (-0.866, 0.5), (-0.866, -0.5))]
+    draw.polygon(hexagon, outline=PRIMARY, width=4)
+
+    small = load_font(26)
+    draw.text((WIDTH - margin - 60, margin + 80), lines["organization"], font=small, fill=MUTED, anchor="rm")
+    draw.text((WIDTH - margin - 60, margin + 120), lines["mission"], font=small, fill=PRIMARY, anchor="rm")
+
+    draw.text((WIDTH / 2, 360), lines["title"], font=load_font(60, bold=True), fill=TEXT, anchor="mm")
+    draw.text((WIDTH / 2, 430), lines["subtitle"], font=small, fill=SECONDARY, anchor="mm")
+    draw.line([margin + 60, 480, WIDTH - margin - 60, 480], fill=(40, 40, 40), width=2)
+
+    draw.text((WIDTH / 2, 540), "SCROLL ID", font=small, fill=SECONDARY, anchor="mm")
+    draw.text((WIDTH / 2, 640), lines["scroll_id"], font=load_font(130, bold=True), fill=PRIMARY, anchor="mm")
+
+    body = load_font(28)
+    for i, line in enumerate(lines["description"]):
+        draw.text((WIDTH / 2, 770 + i * 44), line, font=body, fill=SECONDARY, anchor="mm")
+
+    draw.line([margin + 60, 940, WIDTH - margin - 60, 940], fill=(40, 40, 40), width=2)
+    draw.text((margin + 60, 990), "REGISTERED", font=load_font(22), fill=MUTED, anchor="lm")
+    draw.text((margin + 60, 1030), lines["registered"], font=small, fill=SECONDARY, anchor="lm")
+    draw.text((WIDTH - margin - 60, 990), "STATUS", font=load_font(22), fill=MUTED, anchor="rm")
+    draw.text((WIDTH - margin - 60, 1030), lines["status"], font=load_font(28, bold=True), fill=PRIMARY, anchor="rm")
+
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf_color(rgb: tuple) -> str:
+    return " ".join(f"{c / 255:.3f}" for c in rgb)
+
+
+def render_pdf(certificate: dict) -> bytes:
+    """Single-page landscape PDF using the standard Helvetica fonts"""
+    lines = certificate_lines(certificate)
+    width, height = 792, 612  # US Letter landscape, in points
+
+    def text(x: float, y: float, size: int, value: str, color: tuple, bold: bool = False, align: str = "left") -> str:
+        # Helvetica averages about half an em per character, enough to center short lines
+        approx_width = len(value) * size * (0.6 if bold else 0.5)
+        if align == "center":
+            x -= approx_width / 2
+        elif align == "right":
+            x -= approx_width
+        font = "F2" if bold else "F1"
+        return f"BT {pdf_color(color)} rg /{font} {size} Tf {x:.1f} {y:.1f} Td ({pdf_text(value)}) Tj ET"
+
+    ops = [
+        f"{pdf_color(BACKGROUND)} rg 0 0 {width} {height} re f",
+        f"{pdf_color(PAPER)} rg {pdf_color(PRIMARY)} RG 1.5 w 36 36 {width - 72} {height - 72} re B",
+        text(72, height - 90, 12, lines["organization"], MUTED),
+        text(width - 72, height - 90, 12, lines["mission"], PRIMARY, align="right"),
+        text(width / 2, height - 170, 26, lines["title"], TEXT, bold=True, align="center"),
+        text(width / 2, height - 196, 12, lines["subtitle"], SECONDARY, align="center"),
+        f"0.16 0.16 0.16 RG 1 w 72 {height - 220} m {width - 72} {height - 220} l S",
+        text(width / 2, height - 260, 12, "SCROLL ID", SECONDARY, align="center"),
+        text(width / 2, height - 320, 56, lines["scroll_id"], PRIMARY, bold=True, align="center"),
+    ]
+    for i, line in enumerate(lines["description"]):
+        ops.append(text(width / 2, height - 380 - i * 18, 12, line, SECONDARY, align="center"))
+    ops += [
+        f"0.16 0.16 0.16 RG 1 w 72 120 m {width - 72} 120 l S",
+        text(72, 96, 9, "REGISTERED", MUTED),
+        text(72, 78, 12, lines["registered"], SECONDARY),
+        text(width - 72, 96, 9, "STATUS", MUTED, align="right"),
+        text(width - 72, 78, 12, lines["status"], PRIMARY, bold=True, align="right"),
+    ]
+    content = zlib.compress("\n".join(ops).encode("latin-1", "replace"))
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+         f"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>").encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>",
+        f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode() + content + b"\nendstream",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def render_certificate(certificate: dict, fmt: str) -> bytes:
+    """Render a certificate as PNG or PDF bytes"""
+    if fmt == "png":
+        return render_png(certificate)
+    if fmt == "pdf":
+        return render_pdf(certificate)
+    raise ValueError(f"Unsupported certificate format: {fmt}")
+
+
+def render_certificate_job(certificate: dict, fmt: str) -> Optional[bytes]:
+    """Process-pool entry point; failures come back as None instead of breaking the pool"""
+    try:
+        return render_certificate(certificate, fmt)
+    except Exception:
+        logger.exception("Failed to render %s certificate for %s", fmt, certificate.get("scroll_id"))
+        return None
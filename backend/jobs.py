@@ -0,0 +1,255 @@
+"""Lightweight Mongo-backed background jobs for heavy admin work.
+
+Jobs live in a Mongo collection so any worker process can pick them up and
+so they survive restarts. Each running job holds a lease that its worker
+keeps renewing; when a process dies mid-job the lease expires and another
+worker (or the same one after restart) claims the job again. Handlers can
+save a checkpoint to continue where they stopped instead of starting over.
+"""
+import asyncio
+import logging
+import socket
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ["queued", "running", "completed", "failed", "cancelled"]
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when an admin cancelled the running job"""
+
+
+class JobContext:
+    """Handle passed to job handlers for reporting progress and saving state"""
+
+    def __init__(self, runner: "JobRunner", job: dict):
+        saved = job.get("checkpoint") or {}
+        self.runner = runner
+        self.job_id = job["id"]
+        self.params = job.get("params") or {}
+        self.checkpoint = saved.get("state") or {}
+        self.output_seq = saved.get("output_seq", 0)
+
+    async def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None):
+        """Record progress; raises JobCancelled if the job was cancelled"""
+        update = {"progress.done": done, "progress.updated_at": now_utc()}
+        if total is not None:
+            update["progress.total"] = total
+        if message is not None:
+            update["progress.message"] = message
+        job = await self.runner.jobs.find_one_and_update(
+            {"id": self.job_id},
+            {"$set": update},
+            projection={"_id": 0, "cancel_requested": 1}
+        )
+        if job and job.get("cancel_requested"):
+            raise JobCancelled()
+
+    async def save_checkpoint(self, checkpoint: dict):
+        """Persist resume state; a restarted job receives it as ctx.checkpoint"""
+        self.checkpoint = checkpoint
+        await self.runner.jobs.update_one(
+            {"id": self.job_id},
+            {"$set": {"checkpoint": {"state": checkpoint, "output_seq": self.output_seq}}}
+        )
+
+    async def write_output(self, data: str):
+        """Append a chunk to the job's downloadable output"""
+        await self.runner.outputs.insert_one({
+            "job_id": self.job_id,
+            "seq": self.output_seq,
+            "data": data
+        })
+        self.output_seq += 1
+
+    async def discard_uncheckpointed_output(self):
+        """Drop output chunks a previous attempt wrote after its last checkpoint"""
+        await self.runner.outputs.delete_many({"job_id": self.job_id, "seq": {"$gte": self.output_seq}})
+
+
+JobHandler = Callable[[JobContext], Awaitable[Optional[dict]]]
+
+
+def now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobRunner:
+    """Runs queued jobs on a bounded number of in-process workers"""
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 2.0, lease_seconds: int = 60):
+        self.jobs = None
+        self.outputs = None
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self.workers = []
+        self.wakeup = asyncio.Event()
+        self.running = False
+
+    def register(self, job_type: str):
+        """Decorator registering the handler for a job type"""
+        def decorator(handler: JobHandler) -> JobHandler:
+            self.handlers[job_type] = handler
+            return handler
+        return decorator
+
+    def bind(self, database, jobs_collection: str = "jobs", outputs_collection: str = "job_outputs"):
+        """Point the runner at the database it stores jobs in"""
+        self.jobs = database[jobs_collection]
+        self.outputs = database[outputs_collection]
+
+    async def ensure_indexes(self):
+        await self.jobs.create_index("id", unique=True)
+        await self.jobs.create_index([("status", 1), ("created_at", 1)])
+        await self.outputs.create_index([("job_id", 1), ("seq", 1)], unique=True)
+
+    async def submit(self, job_type: str, params: Optional[dict] = None) -> dict:
+        """Queue a job and wake an idle worker"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": job_type,
+            "params": params or {},
+            "status": "queued",
+            "progress": {"done": 0, "total": None, "message": None},
+            "checkpoint": None,
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now_utc(),
+            "started_at": None,
+            "finished_at": None
+        }
+        await self.jobs.insert_one(dict(job))
+        self.wakeup.set()
+        return job
+
+    async def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job, or ask a running job to stop at its next progress report"""
+        job = await self.jobs.find_one_and_update(
+            {"id": job_id, "status": "queued"},
+            {"$set": {"status": "cancelled", "finished_at": now_utc()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            return job
+        return await self.jobs.find_one_and_update(
+            {"id": job_id},
+            {"$set": {"cancel_requested": True}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def start(self):
+        """Start the workers; jobs interrupted by a previous process are picked up again"""
+        if self.running:
+            return
+        self.running = True
+        self.workers = [asyncio.create_task(self.work()) for _ in range(self.concurrency)]
+        logger.info("Job runner %s started with %d workers", self.worker_id, self.concurrency)
+
+    async def stop(self):
+        """Stop the workers and hand their jobs back to the queue"""
+        self.running = False
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        await self.jobs.update_many(
+            {"status": "running", "worker_id": self.worker_id},
+            {"$set": {"status": "queued", "worker_id": None}}
+        )
+
+    async def claim(self) -> Optional[dict]:
+        """Atomically take the oldest runnable job, including ones whose lease expired"""
+        now = datetime.now(timezone.utc)
+        return await self.jobs.find_one_and_update(
+            {
+                "type": {"$in": list(self.handlers)},
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "lease_expires_at": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": self.worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            projection={"_id": 0},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def work(self):
+        while self.running:
+            try:
+                job = await self.claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to claim job")
+                job = None
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run(job)
+
+    async def keep_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.jobs.update_one(
+                {"id": job_id, "worker_id": self.worker_id},
+                {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)}}
+            )
+
+    async def run(self, job: dict):
+        ctx = JobContext(self, job)
+        lease = asyncio.create_task(self.keep_lease(job["id"]))
+        status, result, error = "completed", None, None
+        try:
+            await ctx.discard_uncheckpointed_output()
+            result = await self.handlers[job["type"]](ctx)
+        except JobCancelled:
+            status = "cancelled"
+        except asyncio.CancelledError:
+            # Shutdown: stop() re-queues the job so it resumes from its checkpoint
+            raise
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["id"], job["type"])
+            status, error = "failed", str(e)
+        finally:
+            lease.cancel()
+        await self.jobs.update_one(
+            {"id": job["id"], "worker_id": self.worker_id},
+            {"$set": {
+                "status": status,
+                "result": result,
+                "error": error,
+                "finished_at": now_utc(),
+                "worker_id": None
+            }}
+        )
+
+    async def iter_output(self, job_id: str):
+        """Stream a job's output chunks in order"""
+        async for chunk in self.outputs.find({"job_id": job_id}, {"_id": 0, "data": 1}).sort("seq", 1):
+            yield chunk["data"]
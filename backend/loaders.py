@@ -0,0 +1,117 @@
+"""Request-scoped batching loaders.
+
+A DataLoader collects every load(key) issued during one event loop tick and
+resolves them with a single batch query, typically one find({field: {"$in":
+keys}}) per collection. Results are memoized for the life of the loader, so
+a handler asking for the same guardian twice only pays for it once.
+
+LoaderScopeMiddleware gives each request a fresh set of loaders; fetching
+loaders outside a request (jobs, startup) returns unscoped ones that neither
+batch across calls nor memoize.
+"""
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+BatchLoad = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class DataLoader:
+    def __init__(self, batch_load: BatchLoad, max_batch_size: int = 1000):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self.results: Dict[Hashable, asyncio.Future] = {}
+        self.pending: List[Hashable] = []
+        self.batches = 0
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        """Future resolving to the value for key, or None if there is none"""
+        future = self.results.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self.results[key] = loop.create_future()
+            self.pending.append(key)
+            if len(self.pending) == 1:
+                loop.call_soon(self.dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value: Any):
+        """Seed the memo, e.g. with a document the handler already fetched"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self.results[key] = future
+
+    def clear(self, key: Hashable):
+        """Forget a memoized value after the handler changes it"""
+        self.results.pop(key, None)
+
+    def dispatch(self):
+        keys, self.pending = self.pending, []
+        for start in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self.run_batch(keys[start:start + self.max_batch_size]))
+
+    async def run_batch(self, keys: List[Hashable]):
+        self.batches += 1
+        futures = [self.results[key] for key in keys]
+        try:
+            found = await self.batch_load(keys)
+        except Exception as e:
+            for key, future in zip(keys, futures):
+                # Failures are not memoized; a later load retries
+                if self.results.get(key) is future:
+                    del self.results[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in zip(keys, futures):
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+def find_by(collection_getter: Callable[[], Any], field: str, projection: Optional[dict] = None) -> BatchLoad:
+    """Batch loader fetching documents whose field is in the requested keys"""
+    async def batch_load(keys: List[Hashable]) -> Dict[Hashable, Any]:
+        docs = await collection_getter().find({field: {"$in": keys}}, projection).to_list(len(keys))
+        return {doc[field]: doc for doc in docs}
+    return batch_load
+
+
+current_scope: ContextVar[Optional[Dict[str, DataLoader]]] = ContextVar("loader_scope", default=None)
+
+
+class LoaderRegistry:
+    """Named loader factories, instantiated once per request scope"""
+
+    def __init__(self):
+        self.factories: Dict[str, Callable[[], DataLoader]] = {}
+
+    def register(self, name: str, batch_load: BatchLoad, max_batch_size: int = 1000):
+        self.factories[name] = lambda: DataLoader(batch_load, max_batch_size)
+
+    def __getitem__(self, name: str) -> DataLoader:
+        scope = current_scope.get()
+        if scope is None:
+            return self.factories[name]()
+        if name not in scope:
+            scope[name] = self.factories[name]()
+        return scope[name]
+
+
+class LoaderScopeMiddleware:
+    """ASGI middleware opening a fresh loader scope for every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
@@ -0,0 +1,213 @@
+"""In-place data migrations.
+
+Each migration streams the documents that still need converting in _id order
+and rewrites them with one unordered bulk_write per batch, so memory stays
+flat and the collection is never rewritten in one long operation. Filters
+only match documents in the old format, which makes a migration safe to
+interrupt, rerun, or run while the app keeps writing new-format documents.
+
+    python migrations.py timestamps
+    python migrations.py uuids [--compact]
+
+The uuids migration reports collStats sizes before and after. Document sizes
+drop as soon as values are converted; WiredTiger keeps the freed file space
+for reuse, so storage and index sizes only shrink on disk after a compact.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Fields once written as isoformat() strings, now stored as BSON dates
+TIMESTAMP_FIELDS: Dict[str, List[str]] = {
+    "guardians": ["registered_at"],
+    "transmissions": ["created_at"],
+    "orders": ["created_at"],
+    "products": ["created_at"],
+    "comments": ["created_at", "deleted_at"],
+    "comments_archive": ["created_at", "deleted_at", "archived_at"],
+    "moderation_terms": ["created_at"],
+    "jobs": ["created_at", "started_at", "finished_at"],
+}
+
+# Fields once written as 36-character UUID strings, now stored as 16-byte BSON binary
+UUID_FIELDS: Dict[str, List[str]] = {
+    "guardians": ["id"],
+    "transmissions": ["id"],
+    "orders": ["id"],
+    "products": ["id"],
+    "comments": ["id", "transmission_id", "parent_id"],
+    "comments_archive": ["id", "transmission_id", "parent_id"],
+}
+
+
+def parse_timestamp(value: str) -> datetime:
+    """Parse a stored ISO timestamp; naive values were written in UTC"""
+    parsed = datetime.fromisoformat(value)
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed
+
+
+async def convert_fields(database, fields: Dict[str, List[str]], convert: Callable[[str], Any], batch_size: int = 1000,
+                         on_progress: Optional[Callable[[dict], object]] = None) -> dict:
+    """Rewrite string values of fields with convert, collection by collection"""
+    stats = {"converted": 0, "unparseable": 0, "collections": {}}
+
+    for name, names in fields.items():
+        collection = database[name]
+        converted = 0
+        batch: List[UpdateOne] = []
+
+        async def flush():
+            nonlocal converted
+            if batch:
+                result = await collection.bulk_write(batch, ordered=False)
+                converted += result.modified_count
+                stats["converted"] += result.modified_count
+                batch.clear()
+                if on_progress:
+                    progress = on_progress(stats)
+                    if asyncio.iscoroutine(progress):
+                        await progress
+
+        query = {"$or": [{field: {"$type": "string"}} for field in names]}
+        projection = {field: 1 for field in names}
+        async for doc in collection.find(query, projection, batch_size=batch_size).sort("_id", 1):
+            update = {}
+            for field in names:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    update[field] = convert(value)
+                except ValueError:
+                    logger.warning("Unparseable %s.%s on %s: %r", name, field, doc["_id"], value)
+                    stats["unparseable"] += 1
+            if update:
+                # Matching the old values leaves documents the app rewrote meanwhile alone
+                batch.append(UpdateOne({"_id": doc["_id"], **{f: doc[f] for f in update}}, {"$set": update}))
+            if len(batch) >= batch_size:
+                await flush()
+        await flush()
+        stats["collections"][name] = converted
+
+    return stats
+
+
+async def migrate_timestamps(database, fields: Dict[str, List[str]] = TIMESTAMP_FIELDS, batch_size: int = 1000,
+                             on_progress: Optional[Callable[[dict], object]] = None) -> dict:
+    """Convert string timestamps to BSON dates
+
+    Sales rollups are dropped afterwards when orders were converted: range
+    matches on dates skip orders still holding strings, so days materialized
+    before or during the migration undercount and must be recomputed.
+    """
+    stats = await convert_fields(database, fields, parse_timestamp, batch_size, on_progress)
+    if "orders" in fields:
+        await database.sales_daily.delete_many({})
+    return stats
+
+
+async def collection_sizes(database, names: Iterable[str]) -> Dict[str, dict]:
+    """collStats sizes in bytes; collections that do not exist are left out"""
+    sizes = {}
+    for name in names:
+        try:
+            stats = await database.command("collStats", name)
+        except OperationFailure:
+            continue
+        sizes[name] = {
+            "count": stats.get("count", 0),
+            "size": stats.get("size", 0),
+            "storage_size": stats.get("storageSize", 0),
+            "index_size": stats.get("totalIndexSize", 0),
+            "index_sizes": dict(stats.get("indexSizes") or {})
+        }
+    return sizes
+
+
+def size_savings(before: Dict[str, dict], after: Dict[str, dict]) -> dict:
+    """Bytes saved per collection and index between two collection_sizes() reports"""
+    savings = {"size": 0, "storage_size": 0, "index_size": 0, "collections": {}}
+    for name in before.keys() & after.keys():
+        saved = {key: before[name][key] - after[name][key] for key in ("size", "storage_size", "index_size")}
+        saved["index_sizes"] = {
+            index: size - after[name]["index_sizes"].get(index, 0)
+            for index, size in before[name]["index_sizes"].items()
+        }
+        savings["collections"][name] = saved
+        for key in ("size", "storage_size", "index_size"):
+            savings[key] += saved[key]
+    return savings
+
+
+async def migrate_uuids(database, fields: Dict[str, List[str]] = UUID_FIELDS, batch_size: int = 1000,
+                        compact: bool = False, on_progress: Optional[Callable[[dict], object]] = None) -> dict:
+    """Convert UUID strings to binary UUIDs and report the space saved
+
+    The client must use uuidRepresentation="standard" so uuid.UUID values
+    are written as binary subtype 4.
+    """
+    before = await collection_sizes(database, fields)
+    stats = await convert_fields(database, fields, uuid.UUID, batch_size, on_progress)
+    if compact:
+        for name in before:
+            try:
+                await database.command("compact", name)
+            except OperationFailure as e:
+                logger.warning("Could not compact %s: %s", name, e)
+    after = await collection_sizes(database, fields)
+    return {**stats, "sizes_before": before, "sizes_after": after, "saved": size_savings(before, after)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Data migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    timestamps_parser = commands.add_parser("timestamps", help="Convert ISO string timestamps to BSON dates")
+    timestamps_parser.add_argument("--collections", nargs="+", choices=list(TIMESTAMP_FIELDS), default=list(TIMESTAMP_FIELDS))
+    timestamps_parser.add_argument("--batch-size", type=int, default=1000)
+    uuids_parser = commands.add_parser("uuids", help="Convert UUID strings to binary UUIDs")
+    uuids_parser.add_argument("--collections", nargs="+", choices=list(UUID_FIELDS), default=list(UUID_FIELDS))
+    uuids_parser.add_argument("--batch-size", type=int, default=1000)
+    uuids_parser.add_argument("--compact", action="store_true", help="Compact each collection afterwards")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def report(stats: dict):
+        logger.info("Converted %d documents", stats["converted"])
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True, uuidRepresentation="standard")
+        database = client[os.environ["DB_NAME"]]
+        try:
+            if args.command == "timestamps":
+                stats = await migrate_timestamps(
+                    database, {name: TIMESTAMP_FIELDS[name] for name in args.collections}, args.batch_size, report
+                )
+            else:
+                stats = await migrate_uuids(
+                    database, {name: UUID_FIELDS[name] for name in args.collections}, args.batch_size,
+                    args.compact, report
+                )
+                logger.info("Bytes saved: %s", stats["saved"])
+            logger.info("Migration finished: %s", {k: stats[k] for k in ("converted", "unparseable", "collections")})
+        finally:
+            client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
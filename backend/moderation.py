@@ -0,0 +1,104 @@
+"""Comment moderation with an Aho-Corasick automaton.
+
+The admin-managed term list is compiled once into a single automaton, so
+matching a comment costs one pass over its text however many terms there
+are. Text is lowercased and common character substitutions are folded
+("h3ll0" reads as "hello") before matching; both steps map one character to
+one character, so match positions stay valid for whole-word checks.
+
+Each term carries an action: "flag" publishes the comment but queues it for
+review, "hold" keeps it hidden until a moderator approves it.
+"""
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple
+
+MODERATION_ACTIONS = ["flag", "hold"]
+
+# Substitutions folded before matching; one character in, one character out
+FOLD = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+
+
+def normalize(text: str) -> str:
+    return text.lower().translate(FOLD)
+
+
+class Term(NamedTuple):
+    term: str
+    action: str
+    whole_word: bool
+
+
+class Match(NamedTuple):
+    term: str
+    action: str
+    start: int
+    end: int
+
+
+class Automaton:
+    def __init__(self, terms: Iterable[Term]):
+        self.terms: List[Term] = []
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[List[int]] = [[]]
+
+        for term in terms:
+            pattern = normalize(term.term.strip())
+            if not pattern:
+                continue
+            self.terms.append(Term(pattern, term.action, term.whole_word))
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                state = next_state
+            self.output[state].append(len(self.terms) - 1)
+
+        # Breadth-first so every fail link points at an already finished, shallower state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def find(self, text: str) -> List[Match]:
+        """Every term occurrence in text, honouring whole-word terms"""
+        normalized = normalize(text)
+        matches = []
+        state = 0
+        for position, char in enumerate(normalized):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for index in self.output[state]:
+                term = self.terms[index]
+                start = position - len(term.term) + 1
+                if term.whole_word and not (
+                    (start == 0 or not normalized[start - 1].isalnum())
+                    and (position + 1 == len(normalized) or not normalized[position + 1].isalnum())
+                ):
+                    continue
+                matches.append(Match(term.term, term.action, start, position + 1))
+        return matches
+
+    def verdict(self, text: str) -> tuple:
+        """Moderation status for text ("held", "flagged" or None) and the distinct terms that matched"""
+        matches = self.find(text)
+        if not matches:
+            return None, []
+        terms = sorted({match.term for match in matches})
+        status = "held" if any(match.action == "hold" for match in matches) else "flagged"
+        return status, terms
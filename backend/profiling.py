@@ -0,0 +1,257 @@
+"""On-demand statistical profiling of live requests.
+
+A request is profiled when it carries an authorized X-Profile header, or when
+it is picked by the sampling rate. While profiled requests are in flight, one
+shared sampler thread wakes every interval and records, for each of them:
+
+- the Python stack when the request's task is running on the event loop, or
+- its await chain when it is suspended, with a leaf frame naming what it is
+  waiting on: "[await mongo] <command> <collection>" while one of its Motor
+  operations is in flight, "[await io]" for anything else, or "[ready,
+  waiting for event loop]" when it could run but other tasks hold the loop.
+
+Mongo time is attributed through MongoProfileListener, a pymongo command
+listener: Motor copies the caller's context into its executor threads, so
+the listener sees which profiled request issued each command.
+
+Samples are kept as folded stacks ("outer;inner count"), which flamegraph.pl
+reads directly and which converts to speedscope JSON with to_speedscope().
+When nothing is being profiled the only cost per request is a header lookup
+and one random() call.
+"""
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-profile"
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    # The function's first line rather than the current one, so samples aggregate per function
+    return f"{code.co_qualname} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+def await_chain(coro) -> tuple:
+    """Frames of a suspended coroutine chain, outermost first, and the object it is blocked on"""
+    frames = []
+    awaited = coro
+    while awaited is not None:
+        frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None) or getattr(awaited, "ag_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None) or getattr(awaited, "ag_await", None)
+    return frames, awaited
+
+
+class Session:
+    """Samples collected for one request"""
+
+    def __init__(self, task: asyncio.Task, loop_thread: int, path: str, method: str):
+        self.id = uuid.uuid4().hex
+        self.task = task
+        self.loop_thread = loop_thread
+        self.path = path
+        self.method = method
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.mongo_inflight: Dict[int, str] = {}
+        self.mongo_commands = 0
+        self.mongo_ms = 0.0
+
+    def sample(self, thread_frame):
+        coro = self.task.get_coro()
+        frames, awaited = await_chain(coro)
+        if not frames:
+            return
+        if getattr(coro, "cr_running", False) and thread_frame is not None:
+            # Running right now: walk the live thread stack down to the task's outermost frame
+            stack = []
+            frame = thread_frame
+            while frame is not None:
+                stack.append(frame_name(frame))
+                if frame is frames[0]:
+                    break
+                frame = frame.f_back
+            stack.reverse()
+        else:
+            stack = [frame_name(frame) for frame in frames]
+            inflight = list(self.mongo_inflight.values())
+            if inflight:
+                stack.append(f"[await mongo] {inflight[-1]}")
+            elif isinstance(awaited, asyncio.Future) and awaited.done():
+                stack.append("[ready, waiting for event loop]")
+            else:
+                stack.append("[await io]")
+        self.stacks[";".join(stack)] += 1
+        self.samples += 1
+
+    def result(self, interval: float, status_code: Optional[int]) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status_code": status_code,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "interval_ms": interval * 1000,
+            "samples": self.samples,
+            "mongo_commands": self.mongo_commands,
+            "mongo_ms": round(self.mongo_ms, 2),
+            # Pairs rather than a dict: stacks contain dots, which do not belong in field names
+            "stacks": [[stack, count] for stack, count in self.stacks.most_common()],
+            "created_at": datetime.now(timezone.utc)
+        }
+
+
+current_session: ContextVar[Optional[Session]] = ContextVar("profile_session", default=None)
+
+
+class MongoProfileListener(monitoring.CommandListener):
+    """Attributes Mongo commands to the profiled request that issued them"""
+
+    def started(self, event):
+        session = current_session.get()
+        if session is not None:
+            collection = event.command.get(event.command_name)
+            label = f"{event.command_name} {collection}" if isinstance(collection, str) else event.command_name
+            session.mongo_inflight[event.request_id] = label
+
+    def finished(self, event):
+        session = current_session.get()
+        if session is not None and session.mongo_inflight.pop(event.request_id, None) is not None:
+            session.mongo_commands += 1
+            session.mongo_ms += event.duration_micros / 1000
+
+    succeeded = finished
+    failed = finished
+
+
+class Sampler:
+    """One background thread sampling every active session, running only while there are any"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.sessions: Dict[str, Session] = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def add(self, session: Session):
+        with self.lock:
+            self.sessions[session.id] = session
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, session: Session):
+        with self.lock:
+            self.sessions.pop(session.id, None)
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.sessions:
+                    self.thread = None
+                    return
+                sessions = list(self.sessions.values())
+            frames = sys._current_frames()
+            for session in sessions:
+                try:
+                    session.sample(frames.get(session.loop_thread))
+                except Exception:
+                    # The coroutine chain can change under us; drop the sample
+                    pass
+            time.sleep(self.interval)
+
+
+def to_folded(profile: dict) -> str:
+    """Brendan Gregg's folded stack format, for flamegraph.pl and similar tools"""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"])
+
+
+def to_speedscope(profile: dict) -> dict:
+    frames, index, samples, weights = [], {}, [], []
+    for stack, count in profile["stacks"]:
+        sample = []
+        for name in stack.split(";"):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            sample.append(index[name])
+        samples.append(sample)
+        weights.append(count * profile["interval_ms"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{profile['method']} {profile['path']}",
+        "exporter": "thesyncbridge-profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"{profile['method']} {profile['path']}",
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights
+        }]
+    }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that are opted in by header or picked by sample_rate"""
+
+    def __init__(self, app, save: Callable[[dict], Awaitable], authorize: Callable[[Dict[str, str]], bool],
+                 sample_rate: float = 0.0, interval: float = 0.005, path_prefix: str = "/api/"):
+        self.app = app
+        self.save = save
+        self.authorize = authorize
+        self.sample_rate = sample_rate
+        self.path_prefix = path_prefix
+        self.sampler = Sampler(interval)
+
+    def wants_profile(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        if PROFILE_HEADER.encode() in headers:
+            decoded = {k.decode("latin-1"): v.decode("latin-1") for k, v in headers.items()}
+            return self.authorize(decoded)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix) or not self.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = Session(asyncio.current_task(), threading.get_ident(), scope["path"], scope["method"])
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", session.id.encode())]}
+            await send(message)
+
+        token = current_session.set(session)
+        self.sampler.add(session)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            self.sampler.remove(session)
+            current_session.reset(token)
+            try:
+                await self.save(session.result(self.sampler.interval, status_code))
+            except Exception:
+                logger.exception("Failed to save profile %s", session.id)
@@ -0,0 +1,223 @@
+"""Mongo command statistics and slow-command log.
+
+CommandStatsListener is a pymongo command listener. For every command it
+aggregates count, latency and documents returned per query shape: the
+command, collection, filter, sort and projection with literal values
+replaced by "?". getMore batches are credited to the shape that opened the
+cursor. Shapes that fetch whole documents or many rows (to_list
+over-fetch) or that were planned as a collection scan stand out in
+shape_stats() without external tooling.
+
+Commands slower than the threshold go into a ring buffer. The first slow
+occurrence of each shape (then at most once per explain_interval) is
+explained with executionStats on the event loop, and the plan summary is
+attached to the logged entry and to the shape's stats.
+
+Everything is held in memory per worker.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+IGNORED = {"explain", "killCursors", "endSessions", "hello", "isMaster", "ismaster", "ping", "buildInfo"}
+# Driver bookkeeping that explain rejects or that is not part of the query
+SESSION_FIELDS = {"lsid", "$clusterTime", "$db", "$readPreference", "txnNumber", "autocommit", "startTransaction",
+                  "readConcern", "writeConcern"}
+
+
+def shape_of(value: Any) -> Any:
+    """Replace literals with "?" while keeping field names and operators"""
+    if isinstance(value, dict):
+        return {k: shape_of(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [shape_of(v) for v in value]
+        return "[?]"
+    return "?"
+
+
+def command_shape(name: str, command: dict) -> dict:
+    """Filters are reduced to their shape; sorts and projections are kept as written"""
+    if name == "find":
+        shape = {"filter": shape_of(command.get("filter") or {})}
+        shape.update({k: dict(command[k]) for k in ("sort", "projection") if command.get(k)})
+        return shape
+    if name == "aggregate":
+        return {"pipeline": [
+            {stage: shape_of(spec) if stage in ("$match", "$group") else
+             dict(spec) if stage in ("$sort", "$project") else "..."}
+            for entry in command.get("pipeline", []) for stage, spec in entry.items()
+        ]}
+    if name in ("count", "distinct"):
+        return {k: shape_of(command[k]) for k in ("query", "key") if command.get(k)}
+    if name == "findAndModify":
+        shape = {"query": shape_of(command.get("query") or {})}
+        if command.get("sort"):
+            shape["sort"] = dict(command["sort"])
+        return shape
+    if name in ("update", "delete"):
+        statements = command.get("updates" if name == "update" else "deletes") or []
+        return {"q": shape_of(statements[0].get("q", {}))} if statements else {}
+    return {}
+
+
+def plan_summary(explain: dict) -> dict:
+    """Winning plan stages and execution counters from an explain reply"""
+    planner = explain.get("queryPlanner") or next(
+        (stage["$cursor"]["queryPlanner"] for stage in explain.get("stages", []) if "$cursor" in stage), {}
+    )
+    stages, node = [], planner.get("winningPlan", {})
+    while node:
+        stages.append(node.get("stage", "?") + (f"({node['indexName']})" if node.get("indexName") else ""))
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0] or node.get("queryPlan")
+    stats = explain.get("executionStats") or {}
+    return {
+        "plan": " <- ".join(stages),
+        "collscan": any(stage.startswith("COLLSCAN") for stage in stages),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_ms": stats.get("executionTimeMillis")
+    }
+
+
+class CommandStatsListener(monitoring.CommandListener):
+    def __init__(self, slow_ms: float = 100.0, log_size: int = 200, explain_interval: float = 300.0):
+        self.slow_ms = slow_ms
+        self.explain_interval = explain_interval
+        self.slow_log = deque(maxlen=log_size)
+        self.shapes: Dict[str, dict] = {}
+        self.inflight: Dict[tuple, tuple] = {}
+        self.cursors: Dict[int, str] = {}  # Open cursor id -> shape that opened it, to credit its getMores
+        self.last_explained: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.client = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind(self, client, loop: asyncio.AbstractEventLoop):
+        """Enable explains, which run through client on loop"""
+        self.client = client
+        self.loop = loop
+
+    def started(self, event):
+        if event.command_name in IGNORED:
+            return
+        collection = event.command.get(event.command_name)
+        key = (event.connection_id, event.request_id)
+        self.inflight[key] = (event.command_name, collection if isinstance(collection, str) else None,
+                              event.database_name, event.command)
+
+    def succeeded(self, event):
+        self.finished(event, event.reply)
+
+    def failed(self, event):
+        self.finished(event, None)
+
+    def finished(self, event, reply: Optional[dict]):
+        started = self.inflight.pop((event.connection_id, event.request_id), None)
+        if started is None:
+            return
+        name, collection, database, command = started
+        duration_ms = event.duration_micros / 1000
+        if name == "getMore":
+            self.finished_get_more(command, reply, duration_ms)
+            return
+        shape = command_shape(name, command)
+        shape_key = f"{name} {database}.{collection} {shape}"
+        returned = None
+        if reply and isinstance(reply.get("cursor"), dict):
+            returned = len(reply["cursor"].get("firstBatch", []))
+            if reply["cursor"].get("id"):
+                if len(self.cursors) >= 10_000:
+                    # Cursors closed by killCursors or timeouts are never seen again
+                    self.cursors.clear()
+                self.cursors[reply["cursor"]["id"]] = shape_key
+
+        with self.lock:
+            stats = self.shapes.get(shape_key)
+            if stats is None:
+                stats = self.shapes[shape_key] = {
+                    "command": name, "collection": collection, "database": database, "shape": shape,
+                    "count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0,
+                    "docs_returned": 0, "max_docs_returned": 0, "get_mores": 0,
+                    # A find without projection or limit pulls whole documents for every match
+                    "unprojected": name == "find" and not command.get("projection"),
+                    "unbounded": name == "find" and not command.get("limit") and not command.get("singleBatch"),
+                    "explain": None
+                }
+            stats["count"] += 1
+            stats["errors"] += reply is None
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if returned is not None:
+                stats["docs_returned"] += returned
+                stats["max_docs_returned"] = max(stats["max_docs_returned"], returned)
+            if duration_ms < self.slow_ms:
+                return
+            stats["slow"] += 1
+            entry = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "command": name, "collection": collection, "database": database, "shape": shape,
+                "duration_ms": round(duration_ms, 2), "returned": returned, "failed": reply is None,
+                "explain": None
+            }
+            self.slow_log.append(entry)
+            now = time.monotonic()
+            explain_due = (
+                name in EXPLAINABLE and self.client is not None
+                and now - self.last_explained.get(shape_key, float("-inf")) >= self.explain_interval
+            )
+            if explain_due:
+                self.last_explained[shape_key] = now
+        if explain_due:
+            asyncio.run_coroutine_threadsafe(self.explain(database, command, entry, stats), self.loop)
+
+    def finished_get_more(self, command: dict, reply: Optional[dict], duration_ms: float):
+        cursor = (reply or {}).get("cursor") or {}
+        shape_key = self.cursors.get(command.get("getMore"))
+        if not cursor.get("id"):
+            self.cursors.pop(command.get("getMore"), None)
+        with self.lock:
+            stats = self.shapes.get(shape_key)
+            if stats is not None:
+                stats["get_mores"] += 1
+                stats["total_ms"] += duration_ms
+                stats["docs_returned"] += len(cursor.get("nextBatch", []))
+
+    async def explain(self, database: str, command: dict, entry: dict, stats: dict):
+        explained = {k: v for k, v in command.items() if k not in SESSION_FIELDS}
+        try:
+            reply = await self.client[database].command({"explain": explained, "verbosity": "executionStats"})
+        except Exception as e:
+            entry["explain"] = {"error": str(e)}
+            return
+        entry["explain"] = stats["explain"] = plan_summary(reply)
+
+    def shape_stats(self, sort: str = "total_ms", limit: int = 50) -> list:
+        with self.lock:
+            shapes = [dict(stats) for stats in self.shapes.values()]
+        for stats in shapes:
+            stats["avg_ms"] = round(stats["total_ms"] / stats["count"], 2)
+            stats["avg_docs_returned"] = round(stats["docs_returned"] / stats["count"], 1)
+            stats["total_ms"] = round(stats["total_ms"], 2)
+            stats["max_ms"] = round(stats["max_ms"], 2)
+        return sorted(shapes, key=lambda stats: stats.get(sort) or 0, reverse=True)[:limit]
+
+    def recent_slow(self, limit: int = 50) -> list:
+        return list(self.slow_log)[-limit:][::-1]
+
+    def reset(self):
+        with self.lock:
+            self.shapes.clear()
+            self.slow_log.clear()
+            self.last_explained.clear()
+            self.cursors.clear()
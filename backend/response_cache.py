@@ -0,0 +1,98 @@
+"""Route-level caching of serialized responses.
+
+@cached_response stores a public GET route's JSON body as ready-to-send bytes
+in a TTLCache, next to a strong ETag. Hits skip both the database and JSON
+encoding, and clients revalidating with If-None-Match get a bodiless 304.
+
+Concurrent misses for the same key are coalesced: one request builds the
+body while the rest await it, so an invalidation under heavy traffic costs a
+single rebuild instead of a stampede. A build that raced an invalidation is
+served to its waiters but not stored.
+
+Invalidate by invalidating the cache through its CacheRegistry (directly or
+via invalidated_by), which keeps every worker coherent.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+from typing import Callable, Dict, Hashable, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import Response
+
+from cache import MISSING, TTLCache
+
+
+def serialize(content) -> bytes:
+    """Encode like FastAPI's JSONResponse so cached and uncached bodies match"""
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def cached_response(cache: TTLCache, key: Optional[Callable[..., Hashable]] = None, cache_control: str = "no-cache"):
+    """Cache a route's JSON response bytes; key receives the route's keyword arguments"""
+
+    def decorator(handler):
+        signature = inspect.signature(handler)
+        adds_request = "request" not in signature.parameters
+        if adds_request:
+            signature = signature.replace(parameters=[
+                *signature.parameters.values(),
+                inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            ])
+        building: Dict[Hashable, tuple] = {}
+
+        async def build(cache_key: Hashable, generation: int, kwargs: dict) -> tuple:
+            try:
+                body = serialize(await handler(**kwargs))
+                entry = (body, body_etag(body))
+                if cache.generation == generation:
+                    cache.set(cache_key, entry)
+                return entry
+            finally:
+                if building.get(cache_key, (None,))[0] == generation:
+                    del building[cache_key]
+
+        @functools.wraps(handler)
+        async def wrapper(**kwargs):
+            request = kwargs.pop("request") if adds_request else kwargs["request"]
+            cache_key = key(**kwargs) if key else tuple(sorted(kwargs.items()))
+            entry = cache.get(cache_key)
+            if entry is MISSING:
+                in_flight = building.get(cache_key)
+                if in_flight is None or in_flight[0] != cache.generation:
+                    generation = cache.generation
+                    task = asyncio.ensure_future(build(cache_key, generation, kwargs))
+                    building[cache_key] = in_flight = (generation, task)
+                # Shielded so one client disconnecting does not fail everyone waiting on the build
+                entry = await asyncio.shield(in_flight[1])
+
+            body, etag = entry
+            headers = {"ETag": etag, "Cache-Control": cache_control}
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=304, headers=headers)
+            return Response(body, media_type="application/json", headers=headers)
+
+        wrapper.__signature__ = signature
+        return wrapper
+
+    return decorator
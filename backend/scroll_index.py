@@ -0,0 +1,123 @@
+"""In-memory index of registered Scroll IDs.
+
+Lets hot write paths confirm a Scroll ID exists without a guardians lookup.
+Three representations trade memory for exactness:
+
+- "set": exact, roughly 70 bytes per ID.
+- "bitmap": exact, one bit per sequence number for IDs in the SB-NNNN format;
+  anything else goes to a small overflow set.
+- "bloom": fixed memory for very large registries, with a configurable false
+  positive rate. A positive answer may (rarely) be wrong; negatives are exact.
+
+Misses are never final: another worker may have registered the ID after this
+index was loaded, so callers fall back to the database and add what they find.
+"""
+import hashlib
+import math
+import re
+from typing import Optional
+
+SCROLL_ID_PATTERN = re.compile(r"^SB-(\d+)$")
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, value: str):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, value: str):
+        for position in self.positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(value))
+
+
+class Bitmap:
+    def __init__(self):
+        self.bits = bytearray()
+        self.overflow = set()
+
+    def add(self, value: str):
+        match = SCROLL_ID_PATTERN.match(value)
+        if not match:
+            self.overflow.add(value)
+            return
+        number = int(match.group(1))
+        if number >> 3 >= len(self.bits):
+            self.bits.extend(bytearray((number >> 3) + 1 - len(self.bits)))
+        self.bits[number >> 3] |= 1 << (number & 7)
+
+    def __contains__(self, value: str) -> bool:
+        match = SCROLL_ID_PATTERN.match(value)
+        if not match:
+            return value in self.overflow
+        # Scroll IDs are zero-padded; only the canonical spelling is registered
+        if value != f"SB-{int(match.group(1)):04d}":
+            return False
+        number = int(match.group(1))
+        return number >> 3 < len(self.bits) and bool(self.bits[number >> 3] & (1 << (number & 7)))
+
+
+class ScrollIdIndex:
+    def __init__(self, mode: str = "set", capacity: int = 1_000_000, error_rate: float = 0.001):
+        if mode == "set":
+            self.members = set()
+        elif mode == "bitmap":
+            self.members = Bitmap()
+        elif mode == "bloom":
+            self.members = BloomFilter(capacity, error_rate)
+        else:
+            raise ValueError(f"Unknown scroll ID index mode: {mode}")
+        self.mode = mode
+        self.max_sequence = 0  # Highest SB-NNNN number seen, to seed the Scroll ID counter
+        self.added = 0
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, scroll_id: str):
+        self.members.add(scroll_id)
+        self.added += 1
+        match = SCROLL_ID_PATTERN.match(scroll_id)
+        if match:
+            self.max_sequence = max(self.max_sequence, int(match.group(1)))
+
+    def contains(self, scroll_id: str) -> bool:
+        found = scroll_id in self.members
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    async def load(self, guardians, batch_size: int = 10_000) -> int:
+        """Add every Scroll ID in the guardians collection"""
+        cursor = guardians.find({}, {"_id": 0, "scroll_id": 1}, batch_size=batch_size)
+        async for guardian in cursor:
+            if guardian.get("scroll_id"):
+                self.add(guardian["scroll_id"])
+        return self.added
+
+    def memory_bytes(self) -> Optional[int]:
+        if self.mode == "bloom":
+            return len(self.members.bits)
+        if self.mode == "bitmap":
+            return len(self.members.bits) + sum(len(v) + 49 for v in self.members.overflow)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "added": self.added,
+            "hits": self.hits,
+            "misses": self.misses,
+            "max_sequence": self.max_sequence,
+            "memory_bytes": self.memory_bytes()
+        }
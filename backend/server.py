@@ -1,40 +1,83 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File
+import time
+# Measured before the heavy imports so cold-start logs include them
+IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+import bson
+from bson import json_util
+from bson.binary import UuidRepresentation
+from bson.errors import InvalidId
 import os
+import asyncio
+import hashlib
+import json
 import logging
+import multiprocessing
 import secrets
-import shutil
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, PlainSerializer
+from typing import Annotated, Dict, List, Optional
 import uuid
-from datetime import datetime, timezone, date
+from datetime import datetime, timezone, date, timedelta
+import base64
 import bcrypt
+import csv
+import io
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from certificates import (
+    CERTIFICATE_FORMATS, certificate_etag, certificate_key, render_certificate, render_certificate_job
+)
+
+from admission import AdmissionController, AdmissionMiddleware
+from cache import MISSING, CacheRegistry, LocalInvalidationBus, MongoInvalidationBus
+from jobs import JOB_STATUSES, JobContext, JobRunner
+from loaders import LoaderRegistry, LoaderScopeMiddleware, find_by
+from migrations import TIMESTAMP_FIELDS, UUID_FIELDS, migrate_timestamps, migrate_uuids, parse_timestamp
+from moderation import MODERATION_ACTIONS, Automaton, Term
+from profiling import MongoProfileListener, ProfilingMiddleware, to_folded, to_speedscope
+from query_stats import CommandStatsListener
+from response_cache import cached_response
+from scroll_index import ScrollIdIndex
+from snapshot import IMPORT_MODES, SNAPSHOT_COLLECTIONS, import_snapshot, iter_snapshot
+from storage import migrate as migrate_storage, storage_from_env
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# Create uploads directory
+# Uploads directory (created when the app starts)
 UPLOAD_DIR = ROOT_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Upload storage backend (STORAGE_BACKEND=local or s3), opened when the app starts
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+storage = None
+ALLOWED_IMAGE_TYPES = ["image/jpeg", "image/png", "image/gif", "image/webp"]
+MAX_UPLOAD_BYTES = 5 * 1024 * 1024
 
-# Create the main app without a prefix
-app = FastAPI()
+# MongoDB connection, opened and warmed by the app lifespan
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 10))
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 100))
+client = None
+db = None
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Simple Admin Auth
 security = HTTPBasic()
+# For routes that serve more to signed-in callers but stay public without credentials
+optional_security = HTTPBasic(auto_error=False)
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'syncbridge325')
 
 def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
@@ -43,6 +86,90 @@ def verify_admin(credentials: HTTPBasicCredentials = Depends(security)):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     return True
 
+def password_matches(password: str, password_hash: Optional[str]) -> bool:
+    """Check a password against a stored bcrypt hash; guardians imported without hashes never match"""
+    if not password_hash:
+        return False
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    except ValueError:
+        return False
+
+async def guardian_authorized(scroll_id: str, credentials: Optional[HTTPBasicCredentials]) -> bool:
+    """Whether HTTP Basic credentials are the admin's, or the guardian's own Scroll ID and password"""
+    if credentials is None:
+        return False
+    if secrets.compare_digest(credentials.password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8")):
+        return True
+    if credentials.username.upper() != scroll_id:
+        return False
+    guardian = await db.guardians.find_one({"scroll_id": scroll_id}, {"_id": 0, "password_hash": 1})
+    # bcrypt is deliberately slow; keep it off the event loop
+    return bool(guardian) and await asyncio.to_thread(password_matches, credentials.password, guardian.get("password_hash"))
+
+def admin_authorized(headers: Dict[str, str]) -> bool:
+    """verify_admin for code running outside a route, given raw request headers"""
+    scheme, _, encoded = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "basic":
+        return False
+    try:
+        password = base64.b64decode(encoded).decode("utf-8").partition(":")[2]
+    except ValueError:
+        return False
+    return secrets.compare_digest(password, ADMIN_PASSWORD)
+
+# Profiling Configuration (admins opt a request in with an X-Profile header)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_TTL_SECONDS = int(os.environ.get('PROFILE_TTL_SECONDS', 7 * 24 * 60 * 60))
+
+# Mongo Command Stats Configuration
+SLOW_COMMAND_MS = float(os.environ.get('SLOW_COMMAND_MS', 100))
+SLOW_COMMAND_LOG_SIZE = int(os.environ.get('SLOW_COMMAND_LOG_SIZE', 200))
+EXPLAIN_INTERVAL_SECONDS = float(os.environ.get('EXPLAIN_INTERVAL_SECONDS', 300))
+query_stats = CommandStatsListener(SLOW_COMMAND_MS, SLOW_COMMAND_LOG_SIZE, EXPLAIN_INTERVAL_SECONDS)
+
+# Idempotency Configuration
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 60 * 60))
+IDEMPOTENCY_LOCK_SECONDS = 60  # In-flight keys older than this are considered abandoned
+IDEMPOTENCY_WAIT_SECONDS = 30  # How long a duplicate waits for the in-flight result
+
+# Comment Write Batching Configuration
+COMMENT_BATCH_ENABLED = os.environ.get('COMMENT_BATCH_ENABLED', 'false').lower() == 'true'
+COMMENT_BATCH_SIZE = int(os.environ.get('COMMENT_BATCH_SIZE', 100))
+COMMENT_BATCH_MAX_DELAY_MS = int(os.environ.get('COMMENT_BATCH_MAX_DELAY_MS', 5))
+COMMENT_ARCHIVE_AFTER_DAYS = int(os.environ.get('COMMENT_ARCHIVE_AFTER_DAYS', 30))
+
+# Admission Control Configuration (per route class limits: ADMISSION_<CLASS>_CONCURRENCY/_QUEUE/_TIMEOUT)
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+admission = AdmissionController.from_env(authorize=admin_authorized)
+
+# Cache Configuration (CACHE_INVALIDATION=mongo broadcasts invalidations to every worker)
+CACHE_INVALIDATION = os.environ.get('CACHE_INVALIDATION', 'mongo')
+caches = CacheRegistry(MongoInvalidationBus() if CACHE_INVALIDATION == 'mongo' else LocalInvalidationBus())
+catalog_cache = caches.cache("catalog", maxsize=1, ttl=30)
+mission_cache = caches.cache("mission", maxsize=1, ttl=60)
+transmissions_cache = caches.cache("transmissions", maxsize=4, ttl=300)
+# Serialized public responses; the registry is only refreshed by its TTL, not on every sign-up
+transmissions_responses = caches.cache("responses.transmissions", maxsize=4, ttl=300, invalidated_by=["transmissions"])
+registry_responses = caches.cache("responses.registry", maxsize=1, ttl=15)
+# Writes only drop the local entry; other workers catch up within the TTL instead of a broadcast per comment or order
+guardian_profiles = caches.cache("guardian_profiles", maxsize=10_000, ttl=30)
+moderation_cache = caches.cache("moderation", maxsize=1, ttl=3600)
+merchandise_responses = caches.cache("responses.merchandise", maxsize=64, ttl=30, invalidated_by=["catalog"])
+
+# Scroll ID existence index (SCROLL_ID_INDEX=set, bitmap or bloom), loaded at startup
+scroll_ids = ScrollIdIndex(
+    os.environ.get('SCROLL_ID_INDEX', 'set'),
+    capacity=int(os.environ.get('SCROLL_ID_BLOOM_CAPACITY', 1_000_000)),
+    error_rate=float(os.environ.get('SCROLL_ID_BLOOM_ERROR_RATE', 0.001))
+)
+
+# Background Job Configuration
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+# Upper bound on render processes for certificates_prerender, whatever the job asks for
+PRERENDER_MAX_WORKERS = int(os.environ.get('PRERENDER_MAX_WORKERS', 4))
+
 # Mission Configuration
 MISSION_START_DATE = date(2026, 2, 22)
 MISSION_TOTAL_DAYS = 325
@@ -54,8 +181,27 @@ DEFAULT_MERCHANDISE = {
     "hat": {"name": "Guardian Cap", "price": 30.00, "description": "Black fitted cap with sacred geometry logo and your personalized Scroll ID", "sizes": None}
 }
 
+# Order status state machine: each status maps to the statuses it may move to
+ORDER_STATUS_TRANSITIONS = {
+    "pending": ["processing", "cancelled"],
+    "processing": ["shipped", "cancelled"],
+    "shipped": ["delivered"],
+    "delivered": [],
+    "cancelled": [],
+}
+
 # ============ MODELS ============
 
+# Stored as a BSON date, rendered in API responses as the ISO string clients already parse
+Timestamp = Annotated[datetime, PlainSerializer(lambda value: value.isoformat(), when_used="json")]
+
+def public_items(items: List[dict]) -> List[dict]:
+    """Order items without stock_field, the products counter a cancellation releases"""
+    return [{k: v for k, v in item.items() if k != "stock_field"} for item in items]
+
+# Stored with their stock_field, rendered in API responses without it
+OrderItems = Annotated[List[dict], PlainSerializer(public_items, when_used="json")]
+
 class GuardianCreate(BaseModel):
     email: EmailStr
     password: str
@@ -66,18 +212,18 @@ class GuardianLogin(BaseModel):
 
 class Guardian(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     email: str
     scroll_id: str
     password_hash: str
-    registered_at: str
+    registered_at: Timestamp
     is_certified: bool = True
 
 class GuardianResponse(BaseModel):
-    id: str
+    id: uuid.UUID
     email: str
     scroll_id: str
-    registered_at: str
+    registered_at: Timestamp
     is_certified: bool
 
 class TransmissionCreate(BaseModel):
@@ -88,12 +234,12 @@ class TransmissionCreate(BaseModel):
 
 class Transmission(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     title: str
     description: str
     video_url: Optional[str] = None
     day_number: int
-    created_at: str
+    created_at: Timestamp
 
 class MissionStatus(BaseModel):
     current_day: int
@@ -108,7 +254,7 @@ class MissionStatus(BaseModel):
 class OrderItem(BaseModel):
     product_type: str  # hoodie, shirt, hat
     size: Optional[str] = None  # S, M, L, XL, XXL (not needed for hat)
-    quantity: int = 1
+    quantity: int = Field(1, ge=1)
 
 class OrderCreate(BaseModel):
     scroll_id: str
@@ -124,10 +270,10 @@ class OrderCreate(BaseModel):
 
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     scroll_id: str
     email: str
-    items: List[dict]
+    items: OrderItems
     total_amount: float
     shipping_name: str
     shipping_address: str
@@ -137,7 +283,27 @@ class Order(BaseModel):
     shipping_country: str
     notes: Optional[str] = None
     status: str = "pending"
-    created_at: str
+    status_history: List[dict] = Field(default_factory=list)
+    created_at: Timestamp
+
+class OrderSummary(BaseModel):
+    id: uuid.UUID
+    status: str
+    total_amount: float
+    created_at: Timestamp
+
+class OrderPage(BaseModel):
+    orders: List[OrderSummary]
+    next_cursor: Optional[str] = None
+
+# Job Models
+class JobCreate(BaseModel):
+    type: str
+    params: dict = Field(default_factory=dict)
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: List[uuid.UUID] = Field(..., min_length=1, max_length=1000)
+    status: str
 
 # Product Models
 class ProductCreate(BaseModel):
@@ -148,10 +314,16 @@ class ProductCreate(BaseModel):
     sizes: Optional[List[str]] = None  # None for items without sizes
     image_type: str = "hoodie"  # hoodie, shirt, hat for preview rendering
     image_url: Optional[str] = None  # URL to product image
+    stock: Optional[int] = None  # None for unlimited stock
+    size_stock: Optional[Dict[str, int]] = None  # Per-size stock, e.g. {"M": 20}
+
+class StockUpdate(BaseModel):
+    stock: Optional[int] = Field(default=None, ge=0)
+    size_stock: Optional[Dict[str, int]] = None
 
 class Product(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
     product_type: str
     name: str
     price: float
@@ -159,33 +331,246 @@ class Product(BaseModel):
     sizes: Optional[List[str]] = None
     image_type: str = "hoodie"
     image_url: Optional[str] = None
-    created_at: str
+    stock: Optional[int] = None
+    size_stock: Optional[Dict[str, int]] = None
+    created_at: Timestamp
     is_active: bool = True
 
 # Comment Models
 class CommentCreate(BaseModel):
-    transmission_id: str
+    transmission_id: uuid.UUID
     scroll_id: str
     content: str
-    parent_id: Optional[str] = None  # For replies
+    parent_id: Optional[uuid.UUID] = None  # For replies
 
 class Comment(BaseModel):
     model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    transmission_id: str
+    id: uuid.UUID = Field(default_factory=uuid.uuid4)
+    transmission_id: uuid.UUID
     scroll_id: str
     content: str
-    parent_id: Optional[str] = None
-    created_at: str
+    parent_id: Optional[uuid.UUID] = None
+    created_at: Timestamp
     is_deleted: bool = False
+    moderation_status: Optional[str] = None  # "flagged" (visible, needs review), "held", "approved"
+
+class CommentFilter(BaseModel):
+    transmission_id: Optional[uuid.UUID] = None
+    scroll_id: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    deleted: Optional[bool] = None  # None matches live and deleted comments
+
+class CommentBulkAction(BaseModel):
+    comment_ids: Optional[List[uuid.UUID]] = Field(default=None, min_length=1, max_length=1000)
+    filter: Optional[CommentFilter] = None
+
+class ModerationTermCreate(BaseModel):
+    term: str = Field(..., min_length=1, max_length=200)
+    action: str = "hold"
+    whole_word: bool = True
+
+# ============ DATA LOADERS ============
+
+# Per-request batched lookups; never expose password hashes through them
+loaders = LoaderRegistry()
+loaders.register("guardians", find_by(lambda: db.guardians, "scroll_id", {"_id": 0, "password_hash": 0}))
+loaders.register("guardians_by_email", find_by(lambda: db.guardians, "email", {"_id": 0, "password_hash": 0}))
+
+async def load_transmissions_by_id(keys: List[uuid.UUID]) -> dict:
+    docs = await db.transmissions.find({"id": id_match(*keys)}, {"_id": 0}).to_list(len(keys))
+    return {as_uuid(doc["id"]): doc for doc in docs}
+
+loaders.register("transmissions", load_transmissions_by_id)
 
 # ============ HELPER FUNCTIONS ============
 
+async def scroll_id_exists(scroll_id: str) -> bool:
+    """Check a Scroll ID against the in-memory index, falling back to the database on a miss"""
+    if scroll_ids.contains(scroll_id):
+        return True
+    guardian = await loaders["guardians"].load(scroll_id)
+    if guardian:
+        scroll_ids.add(scroll_id)
+        return True
+    return False
+
 async def generate_scroll_id() -> str:
-    """Generate unique Scroll ID in format SB-XXXX"""
-    count = await db.guardians.count_documents({})
-    scroll_number = count + 1
-    return f"SB-{scroll_number:04d}"
+    """Draw the next Scroll ID in format SB-XXXX from the atomic counter"""
+    counter = await db.counters.find_one_and_update(
+        {"_id": "scroll_id"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return f"SB-{counter['seq']:04d}"
+
+async def seed_scroll_id_counter():
+    """Move the counter past every Scroll ID already issued; safe to run on every worker"""
+    await db.counters.update_one(
+        {"_id": "scroll_id"},
+        {"$max": {"seq": scroll_ids.max_sequence}},
+        upsert=True
+    )
+
+def is_duplicate_email(error: DuplicateKeyError) -> bool:
+    key_pattern = (error.details or {}).get("keyPattern") or {}
+    return "email" in key_pattern or "email_1" in str(error)
+
+async def load_catalog() -> dict:
+    """Load active products keyed by type, falling back to the defaults"""
+    products = await db.products.find({"is_active": True}, {"_id": 0}).to_list(100)
+    if not products:
+        # Return default products if none in DB
+        return DEFAULT_MERCHANDISE
+    
+    # Convert to dict format and merge with defaults
+    db_products = {p["product_type"]: p for p in products}
+    
+    # Ensure all default products are available
+    result = {}
+    for product_type, default_product in DEFAULT_MERCHANDISE.items():
+        if product_type in db_products:
+            result[product_type] = db_products[product_type]
+        else:
+            result[product_type] = default_product
+    
+    return result
+
+async def load_transmissions() -> List[Transmission]:
+    transmissions = await db.transmissions.find(
+        {}, {"_id": 0}
+    ).sort("day_number", -1).to_list(100)
+    return [Transmission(**t) for t in transmissions]
+
+async def load_latest_transmission() -> Optional[Transmission]:
+    transmission = await db.transmissions.find_one(
+        {}, {"_id": 0},
+        sort=[("day_number", -1)]
+    )
+    if not transmission:
+        return None
+    return Transmission(**transmission)
+
+async def load_moderation() -> Automaton:
+    terms = await db.moderation_terms.find({}, {"_id": 0, "term": 1, "action": 1, "whole_word": 1}).to_list(None)
+    return Automaton(Term(t["term"], t["action"], t["whole_word"]) for t in terms)
+
+async def get_moderation() -> Automaton:
+    """Compiled moderation automaton; rebuilt only after the term list changes"""
+    return await moderation_cache.get_or_load("automaton", load_moderation)
+
+async def get_catalog() -> dict:
+    """Get the merchandise catalog; stock counters shown may lag by the cache TTL"""
+    return await catalog_cache.get_or_load("catalog", load_catalog)
+
+def timestamp_iso(value) -> str:
+    """ISO string of a stored timestamp; documents the timestamps_migrate job has not reached already hold one"""
+    return value if isinstance(value, str) else value.isoformat()
+
+def as_timestamp(value) -> datetime:
+    """A stored timestamp as a datetime, whether or not timestamps_migrate has converted it"""
+    return parse_timestamp(value) if isinstance(value, str) else value
+
+def as_uuid(value) -> uuid.UUID:
+    """An id as a UUID, whether it was read as a binary UUID or as a string not yet converted"""
+    return value if isinstance(value, uuid.UUID) else uuid.UUID(value)
+
+def id_match(*values) -> dict:
+    """Match ids stored as binary UUIDs or, until the uuids_migrate job has converted them, as strings"""
+    ids = [as_uuid(value) for value in values]
+    return {"$in": [*ids, *map(str, ids)]}
+
+def keyset_after(created_at, row_id) -> dict:
+    """Rows after (created_at, row_id) in (created_at desc, id desc) order"""
+    after = [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": row_id}}
+    ]
+    # Comparisons only match values of the same BSON type; until the migrations finish, rows
+    # holding string timestamps or ids sort after every date or binary UUID
+    if isinstance(created_at, datetime):
+        after.append({"created_at": {"$type": "string"}})
+    if isinstance(row_id, uuid.UUID):
+        after.append({"created_at": created_at, "id": {"$type": "string"}})
+    return {"$or": after}
+
+# Extended JSON so datetimes and UUIDs come back typed, datetimes to the millisecond Mongo stores
+CURSOR_JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS.with_options(uuid_representation=UuidRepresentation.STANDARD)
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset pagination cursor from the last row's sort values"""
+    encoded = json_util.dumps(values, json_options=CURSOR_JSON_OPTIONS)
+    return base64.urlsafe_b64encode(encoded.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, *types: type) -> list:
+    """Sort values of a cursor, which must be of the given types"""
+    try:
+        values = json_util.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii")), json_options=CURSOR_JSON_OPTIONS
+        )
+    except (ValueError, TypeError, IndexError, ArithmeticError, InvalidId):
+        # Crafted Extended JSON ($date, $oid, $numberLong) fails in the decoder in several ways
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types) or not all(map(isinstance, values, types)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def allowed_previous_statuses(status: str) -> List[str]:
+    """Get the order statuses that may transition into the given status"""
+    return [s for s, targets in ORDER_STATUS_TRANSITIONS.items() if status in targets]
+
+def status_history_entry(from_status: Optional[str], to_status: str) -> dict:
+    """Build a status history record for an order transition"""
+    return {
+        "from": from_status,
+        "status": to_status,
+        "changed_at": datetime.now(timezone.utc)
+    }
+
+def stock_counter_field(product: dict, size: Optional[str]) -> Optional[str]:
+    """Get the products field holding the stock counter for an item, None if untracked"""
+    if product.get("size_stock") is not None:
+        if not size:
+            raise HTTPException(status_code=400, detail=f"Size required for {product['name']}")
+        # Also keeps arbitrary sizes from becoming field paths in the reservation update
+        if size not in product["size_stock"]:
+            raise HTTPException(status_code=400, detail=f"Size {size} is not available for {product['name']}")
+        return f"size_stock.{size}"
+    if product.get("stock") is not None:
+        return "stock"
+    return None
+
+async def release_stock(reservations: List[dict]):
+    """Return reserved units to their stock counters with one bulk write, one update per product"""
+    increments = {}
+    for item in reservations:
+        if item.get("stock_field"):
+            product_inc = increments.setdefault(item["product_type"], {})
+            product_inc[item["stock_field"]] = product_inc.get(item["stock_field"], 0) + item["quantity"]
+    if increments:
+        await db.products.bulk_write(
+            [UpdateOne({"product_type": product_type}, {"$inc": inc}) for product_type, inc in increments.items()],
+            ordered=False
+        )
+
+async def release_cancelled_order_stock(order_ids: List[uuid.UUID]):
+    """Release stock held by cancelled orders exactly once"""
+    if not order_ids:
+        return
+    # Claiming the release flag first keeps retries and concurrent cancels from double-counting;
+    # the claim id tells this call which of the orders it won
+    claim = str(uuid.uuid4())
+    result = await db.orders.update_many(
+        {"id": id_match(*order_ids), "status": "cancelled", "stock_released": {"$ne": True}},
+        {"$set": {"stock_released": True, "stock_release_claim": claim}}
+    )
+    if not result.modified_count:
+        return
+    claimed = await db.orders.find(
+        {"id": id_match(*order_ids), "stock_release_claim": claim}, {"_id": 0, "items": 1}
+    ).to_list(None)
+    await release_stock([item for order in claimed for item in order["items"]])
 
 def get_mission_status() -> MissionStatus:
     """Calculate current mission day and status"""
@@ -228,48 +613,292 @@ def get_mission_status() -> MissionStatus:
         is_active=0 < days_elapsed <= MISSION_TOTAL_DAYS
     )
 
+# ============ IDEMPOTENCY ============
+
+# In-flight idempotent requests in this process, so local duplicates await instead of polling
+inflight_idempotent = {}
+
+def idempotent_replay(record: dict) -> JSONResponse:
+    """Build the response for a completed idempotent request"""
+    return JSONResponse(
+        status_code=record["status_code"],
+        content=record["body"],
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+async def claim_idempotency_key(record_id: str, fingerprint: str) -> Optional[dict]:
+    """Claim an idempotency key; returns the existing record if someone else holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.idempotency_keys.insert_one({
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "status": "in_flight",
+            "created_at": now
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+    
+    # Take over keys whose owner died before finishing
+    abandoned = await db.idempotency_keys.find_one_and_update(
+        {
+            "_id": record_id,
+            "status": "in_flight",
+            "fingerprint": fingerprint,
+            "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)}
+        },
+        {"$set": {"created_at": now}}
+    )
+    if abandoned:
+        return None
+    return await db.idempotency_keys.find_one({"_id": record_id}) or {"status": "released"}
+
+async def wait_for_idempotent_result(record_id: str, fingerprint: str):
+    """Wait for an in-flight duplicate to finish and replay its response"""
+    deadline = asyncio.get_running_loop().time() + IDEMPOTENCY_WAIT_SECONDS
+    delay = 0.05
+    while asyncio.get_running_loop().time() < deadline:
+        local = inflight_idempotent.get(record_id)
+        if local:
+            try:
+                await asyncio.wait_for(asyncio.shield(local), timeout=IDEMPOTENCY_WAIT_SECONDS)
+            except Exception:
+                pass
+        
+        record = await db.idempotency_keys.find_one({"_id": record_id})
+        if not record:
+            return None  # The original attempt failed and released the key
+        if record["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if record["status"] == "completed":
+            return idempotent_replay(record)
+        
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+    
+    raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+async def run_idempotent(scope: str, key: Optional[str], fingerprint_data: dict, handler):
+    """Run handler at most once per Idempotency-Key, replaying the stored response for retries"""
+    if not key:
+        return await handler()
+    if len(key) > 255:
+        raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+    
+    record_id = f"{scope}:{key}"
+    fingerprint = hashlib.sha256(
+        json.dumps(jsonable_encoder(fingerprint_data), sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    
+    while True:
+        existing = await claim_idempotency_key(record_id, fingerprint)
+        if existing is None:
+            break
+        if existing["status"] != "released" and existing["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if existing["status"] == "completed":
+            return idempotent_replay(existing)
+        replay = await wait_for_idempotent_result(record_id, fingerprint)
+        if replay is not None:
+            return replay
+    
+    done = asyncio.get_running_loop().create_future()
+    inflight_idempotent[record_id] = done
+    try:
+        try:
+            result = await handler()
+        except HTTPException as e:
+            # Client errors are part of the outcome and replay like successes
+            if e.status_code >= 500:
+                raise
+            status_code, body = e.status_code, {"detail": e.detail}
+            await db.idempotency_keys.update_one(
+                {"_id": record_id},
+                {"$set": {"status": "completed", "status_code": status_code, "body": body}}
+            )
+            raise
+        await db.idempotency_keys.update_one(
+            {"_id": record_id},
+            {"$set": {"status": "completed", "status_code": 200, "body": jsonable_encoder(result)}}
+        )
+        return result
+    except BaseException as e:
+        if not (isinstance(e, HTTPException) and e.status_code < 500):
+            await db.idempotency_keys.delete_one({"_id": record_id, "status": "in_flight"})
+        raise
+    finally:
+        inflight_idempotent.pop(record_id, None)
+        done.set_result(None)
+
+# ============ WRITE BATCHING ============
+
+class WriteBatcher:
+    """Coalesce single-document inserts into insert_many calls.
+    
+    Each caller still awaits the outcome of its own document. A batch is
+    flushed when it reaches max_batch_size or max_delay seconds after its
+    first document arrived, whichever comes first.
+    """
+    
+    def __init__(self, collection_name: str, max_batch_size: int, max_delay: float):
+        self.collection_name = collection_name
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.pending = []
+        self.timer = None
+        self.flushes = set()
+        self.closed = False
+    
+    async def insert(self, doc: dict):
+        """Queue a document and wait until its batch is written"""
+        if self.closed:
+            await db[self.collection_name].insert_one(doc)
+            return
+        
+        written = asyncio.get_running_loop().create_future()
+        self.pending.append((doc, written))
+        if len(self.pending) >= self.max_batch_size:
+            self.start_flush()
+        elif self.timer is None:
+            self.timer = asyncio.create_task(self.flush_after_delay())
+        await written
+    
+    async def flush_after_delay(self):
+        # The timer only ever sleeps, so cancelling it cannot interrupt a write; the write is a tracked flush
+        await asyncio.sleep(self.max_delay)
+        self.timer = None
+        self.start_flush()
+    
+    def start_flush(self):
+        """Hand the full batch to a background write so new documents start a fresh batch"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        task = asyncio.create_task(self.write_batch(batch))
+        self.flushes.add(task)
+        task.add_done_callback(self.flushes.discard)
+    
+    async def flush(self):
+        """Write every queued document with one insert_many"""
+        batch, self.pending = self.pending, []
+        await self.write_batch(batch)
+    
+    async def write_batch(self, batch: list):
+        if not batch:
+            return
+        
+        failed = {}
+        try:
+            await db[self.collection_name].insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # Unordered inserts report the documents that failed; the rest were written
+            failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+        except Exception as e:
+            failed = {i: e for i in range(len(batch))}
+        
+        for i, (_, written) in enumerate(batch):
+            if written.done():
+                continue
+            error = failed.get(i)
+            if error is None:
+                written.set_result(None)
+            elif isinstance(error, Exception):
+                written.set_exception(error)
+            else:
+                written.set_exception(DuplicateKeyError(error.get("errmsg", "Write failed"), error.get("code")))
+    
+    async def close(self):
+        """Stop batching and write whatever is still queued"""
+        self.closed = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.flushes:
+            await asyncio.gather(*self.flushes, return_exceptions=True)
+        await self.flush()
+
+comment_batcher = WriteBatcher(
+    "comments",
+    max_batch_size=COMMENT_BATCH_SIZE,
+    max_delay=COMMENT_BATCH_MAX_DELAY_MS / 1000
+) if COMMENT_BATCH_ENABLED else None
+
+async def insert_comment(doc: dict):
+    """Insert a comment, through the write batcher when it is enabled"""
+    if comment_batcher:
+        await comment_batcher.insert(doc)
+    else:
+        await db.comments.insert_one(doc)
+
 # ============ ROUTES ============
 
 @api_router.get("/")
 async def root():
     return {"message": "TheSyncBridge API - Welcome Guardian"}
 
+@api_router.get("/health/live")
+async def liveness():
+    """Report that the process is up"""
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness(request: Request):
+    """Report ready only once the pool is warm, indexes exist and caches are primed"""
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Starting up")
+    return {"status": "ready", "startup_ms": request.app.state.startup_ms}
+
 @api_router.get("/mission/status", response_model=MissionStatus)
 async def get_mission_status_endpoint():
     """Get current mission status and day count"""
-    return get_mission_status()
+    status = mission_cache.get("status")
+    if status is MISSING:
+        status = get_mission_status()
+        mission_cache.set("status", status)
+    return status
 
 @api_router.post("/guardians/register", response_model=GuardianResponse)
-async def register_guardian(guardian_data: GuardianCreate):
+async def register_guardian(guardian_data: GuardianCreate, idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
     """Register a new Blue Guardian and generate Scroll ID"""
+    # The password never goes into the stored fingerprint
+    return await run_idempotent(
+        "guardians.register",
+        idempotency_key,
+        guardian_data.model_dump(exclude={"password"}),
+        lambda: register_new_guardian(guardian_data)
+    )
+
+async def register_new_guardian(guardian_data: GuardianCreate) -> GuardianResponse:
+    """Create the guardian record for a registration request"""
     # Validate password
     if len(guardian_data.password) < 6:
         raise HTTPException(status_code=400, detail="Password must be at least 6 characters")
     
-    # Check if email already registered
-    existing = await db.guardians.find_one(
-        {"email": guardian_data.email.lower()},
-        {"_id": 0}
-    )
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered. Please login instead.")
-    
-    # Generate unique Scroll ID
-    scroll_id = await generate_scroll_id()
-    
     # Hash password
     password_hash = bcrypt.hashpw(guardian_data.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
     
-    guardian = Guardian(
-        email=guardian_data.email.lower(),
-        scroll_id=scroll_id,
-        password_hash=password_hash,
-        registered_at=datetime.now(timezone.utc).isoformat(),
-        is_certified=True
-    )
-    
-    doc = guardian.model_dump()
-    await db.guardians.insert_one(doc)
+    # Unique indexes on email and scroll_id decide duplicates, so concurrent sign-ups cannot race
+    for _ in range(5):
+        guardian = Guardian(
+            email=guardian_data.email.lower(),
+            scroll_id=await generate_scroll_id(),
+            password_hash=password_hash,
+            registered_at=datetime.now(timezone.utc),
+            is_certified=True
+        )
+        try:
+            await db.guardians.insert_one(guardian.model_dump())
+            break
+        except DuplicateKeyError as e:
+            if is_duplicate_email(e):
+                raise HTTPException(status_code=400, detail="Email already registered. Please login instead.")
+            # Scroll ID issued outside the counter; draw the next one
+            scroll_ids.add(guardian.scroll_id)
+    else:
+        raise HTTPException(status_code=503, detail="Could not allocate a Scroll ID, please retry")
+    scroll_ids.add(guardian.scroll_id)
     
     return GuardianResponse(
         id=guardian.id,
@@ -290,7 +919,7 @@ async def login_guardian(login_data: GuardianLogin):
         raise HTTPException(status_code=401, detail="Invalid Scroll ID or password")
     
     # Verify password
-    if not bcrypt.checkpw(login_data.password.encode('utf-8'), guardian.get('password_hash', '').encode('utf-8')):
+    if not password_matches(login_data.password, guardian.get('password_hash')):
         raise HTTPException(status_code=401, detail="Invalid Scroll ID or password")
     
     return GuardianResponse(**{k: v for k, v in guardian.items() if k != 'password_hash'})
@@ -298,15 +927,13 @@ async def login_guardian(login_data: GuardianLogin):
 @api_router.get("/guardians/lookup")
 async def lookup_guardian(email: str):
     """Look up a guardian by email"""
-    guardian = await db.guardians.find_one(
-        {"email": email.lower()},
-        {"_id": 0}
-    )
+    guardian = await loaders["guardians_by_email"].load(email.lower())
     if not guardian:
         raise HTTPException(status_code=404, detail="Guardian not found")
     return GuardianResponse(**guardian)
 
 @api_router.get("/guardians/registry", response_model=List[GuardianResponse])
+@cached_response(registry_responses)
 async def get_guardian_registry():
     """Get list of all registered guardians"""
     guardians = await db.guardians.find({}, {"_id": 0}).to_list(1000)
@@ -321,33 +948,176 @@ async def get_guardian_count():
 @api_router.get("/guardians/{scroll_id}", response_model=GuardianResponse)
 async def get_guardian_by_scroll_id(scroll_id: str):
     """Get guardian by Scroll ID"""
-    guardian = await db.guardians.find_one(
-        {"scroll_id": scroll_id.upper()},
-        {"_id": 0}
-    )
+    guardian = await loaders["guardians"].load(scroll_id.upper())
     if not guardian:
         raise HTTPException(status_code=404, detail="Guardian not found")
     return GuardianResponse(**guardian)
 
-@api_router.get("/certificate/{scroll_id}")
-async def get_certificate(scroll_id: str):
-    """Get certificate data for a guardian"""
-    guardian = await db.guardians.find_one(
-        {"scroll_id": scroll_id.upper()},
-        {"_id": 0}
-    )
-    if not guardian:
-        raise HTTPException(status_code=404, detail="Guardian not found")
-    
+def guardian_profile_pipeline(scroll_id: str) -> list:
+    """Guardian, comment activity and order activity in one aggregation"""
+    return [
+        {"$match": {"scroll_id": scroll_id}},
+        {"$project": {"_id": 0, "id": 1, "scroll_id": 1, "registered_at": 1, "is_certified": 1}},
+        {"$lookup": {
+            "from": "comments",
+            "let": {"scroll_id": "$scroll_id"},
+            "pipeline": [
+                {"$match": {
+                    "$expr": {"$eq": ["$scroll_id", "$$scroll_id"]},
+                    "is_deleted": False,
+                    "moderation_status": {"$ne": "held"}
+                }},
+                {"$facet": {
+                    "count": [{"$count": "n"}],
+                    "recent": [
+                        {"$sort": {"created_at": -1}},
+                        {"$limit": 5},
+                        {"$project": {"_id": 0, "id": 1, "transmission_id": 1, "content": 1, "created_at": 1}}
+                    ],
+                    "transmissions": [{"$group": {"_id": "$transmission_id"}}, {"$count": "n"}]
+                }}
+            ],
+            "as": "comments"
+        }},
+        {"$lookup": {
+            "from": "orders",
+            "let": {"scroll_id": "$scroll_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$scroll_id", "$$scroll_id"]}}},
+                {"$facet": {
+                    "by_status": [{"$group": {
+                        "_id": "$status", "count": {"$sum": 1}, "amount": {"$sum": "$total_amount"}
+                    }}],
+                    "recent": [
+                        {"$sort": {"created_at": -1}},
+                        {"$limit": 5},
+                        {"$project": {"_id": 0, "id": 1, "status": 1, "total_amount": 1, "created_at": 1}}
+                    ]
+                }}
+            ],
+            "as": "orders"
+        }}
+    ]
+
+async def load_guardian_profile(scroll_id: str) -> Optional[dict]:
+    results = await db.guardians.aggregate(guardian_profile_pipeline(scroll_id)).to_list(1)
+    if not results:
+        return None
+    guardian = results[0]
+    comments = guardian.pop("comments")[0]
+    orders = guardian.pop("orders")[0]
+    by_status = {entry["_id"]: entry["count"] for entry in orders["by_status"]}
+    activity = [as_timestamp(recent[0]["created_at"]) for recent in (comments["recent"], orders["recent"]) if recent]
+    return {
+        **guardian,
+        "last_activity_at": max(activity) if activity else None,
+        "comments": {
+            "count": comments["count"][0]["n"] if comments["count"] else 0,
+            "transmissions": comments["transmissions"][0]["n"] if comments["transmissions"] else 0,
+            "recent": comments["recent"]
+        },
+        "orders": {
+            "count": sum(by_status.values()),
+            "by_status": by_status,
+            # Cancelled orders are refunded, so they do not count towards spend
+            "total_spent": round(sum(e["amount"] for e in orders["by_status"] if e["_id"] != "cancelled"), 2),
+            "recent": orders["recent"]
+        }
+    }
+
+@api_router.get("/guardians/{scroll_id}/profile")
+async def get_guardian_profile(scroll_id: str, credentials: Optional[HTTPBasicCredentials] = Depends(optional_security)):
+    """Guardian profile with comment activity; order activity is only shown to the guardian and admins"""
+    scroll_id = scroll_id.upper()
+    profile = guardian_profiles.get(scroll_id)
+    if profile is MISSING:
+        profile = await load_guardian_profile(scroll_id)
+        if not profile:
+            # Not cached, so a guardian registering right after a miss is visible at once
+            raise HTTPException(status_code=404, detail="Guardian not found")
+        guardian_profiles.set(scroll_id, profile)
+    if await guardian_authorized(scroll_id, credentials):
+        return profile
+    # Order ids open the full order, shipping address included, and spend is private
+    recent_comments = profile["comments"]["recent"]
+    return {
+        **{key: value for key, value in profile.items() if key != "orders"},
+        "last_activity_at": as_timestamp(recent_comments[0]["created_at"]) if recent_comments else None
+    }
+
+def certificate_data(guardian: dict) -> dict:
+    """Build the certificate payload for a guardian"""
     return {
         "scroll_id": guardian["scroll_id"],
-        "registered_at": guardian["registered_at"],
+        "registered_at": timestamp_iso(guardian["registered_at"]),
         "is_certified": guardian["is_certified"],
         "certificate_title": "Certificate of Guardianship",
         "organization": "TheSyncBridge",
         "mission": "325-Day Crossing"
     }
 
+@api_router.get("/certificate/{scroll_id}")
+async def get_certificate(scroll_id: str):
+    """Get certificate data for a guardian"""
+    guardian = await loaders["guardians"].load(scroll_id.upper())
+    if not guardian:
+        raise HTTPException(status_code=404, detail="Guardian not found")
+    
+    return certificate_data(guardian)
+
+# Certificate renders known to be in storage, and renders currently in progress
+rendered_certificates = set()
+rendering_certificates = {}
+
+async def iter_bytes(data: bytes):
+    yield data
+
+async def render_and_store_certificate(certificate: dict, fmt: str, key: str):
+    data = await asyncio.to_thread(render_certificate, certificate, fmt)
+    await storage.save_stream(key, iter_bytes(data), CERTIFICATE_FORMATS[fmt])
+    rendered_certificates.add(key)
+
+async def ensure_certificate_rendered(certificate: dict, fmt: str) -> str:
+    """Render a certificate into storage unless a cached render exists; returns its key"""
+    key = certificate_key(certificate, fmt)
+    if key in rendered_certificates:
+        return key
+    if await storage.exists(key):
+        rendered_certificates.add(key)
+        return key
+    
+    # Concurrent first views of the same certificate share one render
+    task = rendering_certificates.get(key)
+    if task is None:
+        task = asyncio.create_task(render_and_store_certificate(certificate, fmt, key))
+        rendering_certificates[key] = task
+        task.add_done_callback(lambda _: rendering_certificates.pop(key, None))
+    await asyncio.shield(task)
+    return key
+
+@api_router.get("/certificate/{scroll_id}/{fmt}")
+async def get_certificate_artifact(scroll_id: str, fmt: str, if_none_match: Optional[str] = Header(default=None)):
+    """Get the rendered certificate as a PNG or PDF"""
+    if fmt not in CERTIFICATE_FORMATS:
+        raise HTTPException(status_code=404, detail=f"Unsupported format. Must be one of: {list(CERTIFICATE_FORMATS)}")
+    
+    guardian = await loaders["guardians"].load(scroll_id.upper())
+    if not guardian:
+        raise HTTPException(status_code=404, detail="Guardian not found")
+    
+    certificate = certificate_data(guardian)
+    etag = certificate_etag(certificate, fmt)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    key = await ensure_certificate_rendered(certificate, fmt)
+    url = await storage.read_url(key)
+    if url:
+        return RedirectResponse(url, status_code=307, headers=headers)
+    headers["Content-Disposition"] = f'inline; filename="{certificate["scroll_id"]}.{fmt}"'
+    return StreamingResponse(storage.read_stream(key), media_type=CERTIFICATE_FORMATS[fmt], headers=headers)
+
 # ============ TRANSMISSIONS ============
 
 @api_router.post("/transmissions", response_model=Transmission)
@@ -358,39 +1128,34 @@ async def create_transmission(transmission_data: TransmissionCreate, admin: bool
         description=transmission_data.description,
         video_url=transmission_data.video_url,
         day_number=transmission_data.day_number,
-        created_at=datetime.now(timezone.utc).isoformat()
+        created_at=datetime.now(timezone.utc)
     )
     
     doc = transmission.model_dump()
     await db.transmissions.insert_one(doc)
+    await caches.invalidate("transmissions")
     
     return transmission
 
 @api_router.get("/transmissions", response_model=List[Transmission])
+@cached_response(transmissions_responses, key=lambda: "all")
 async def get_transmissions():
     """Get all transmissions"""
-    transmissions = await db.transmissions.find(
-        {}, {"_id": 0}
-    ).sort("day_number", -1).to_list(100)
-    return [Transmission(**t) for t in transmissions]
+    return await transmissions_cache.get_or_load("all", load_transmissions)
 
 @api_router.get("/transmissions/latest")
+@cached_response(transmissions_responses, key=lambda: "latest")
 async def get_latest_transmission():
     """Get the latest transmission"""
-    transmission = await db.transmissions.find_one(
-        {}, {"_id": 0},
-        sort=[("day_number", -1)]
-    )
-    if not transmission:
-        return None
-    return Transmission(**transmission)
+    return await transmissions_cache.get_or_load("latest", load_latest_transmission)
 
 @api_router.delete("/transmissions/{transmission_id}")
-async def delete_transmission(transmission_id: str, admin: bool = Depends(verify_admin)):
+async def delete_transmission(transmission_id: uuid.UUID, admin: bool = Depends(verify_admin)):
     """Delete a transmission (Admin only)"""
-    result = await db.transmissions.delete_one({"id": transmission_id})
+    result = await db.transmissions.delete_one({"id": id_match(transmission_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Transmission not found")
+    await caches.invalidate("transmissions")
     return {"message": "Transmission deleted successfully"}
 
 # ============ ADMIN AUTH ============
@@ -402,28 +1167,78 @@ async def admin_login(credentials: HTTPBasicCredentials = Depends(security)):
         return {"message": "Login successful", "authenticated": True}
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
+@api_router.get("/admin/admission/stats")
+async def get_admission_stats(admin: bool = Depends(verify_admin)):
+    """Concurrency and queue metrics per route class (Admin only)"""
+    return {"enabled": ADMISSION_CONTROL_ENABLED, "classes": admission.stats()}
+
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats(admin: bool = Depends(verify_admin)):
+    """Get hit, miss and size counters for the in-process caches (Admin only)"""
+    return {**caches.stats(), "scroll_ids": scroll_ids.stats()}
+
+# ============ PROFILING ============
+
+async def save_profile(profile: dict):
+    await db.profiles.insert_one(profile)
+
+@api_router.get("/admin/profiles")
+async def list_profiles(path: Optional[str] = None, limit: int = 50, admin: bool = Depends(verify_admin)):
+    """List recent request profiles, newest first (Admin only)"""
+    query = {"path": path} if path else {}
+    return await db.profiles.find(
+        query, {"_id": 0, "stacks": 0}
+    ).sort("created_at", -1).to_list(min(max(limit, 1), 200))
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "speedscope", admin: bool = Depends(verify_admin)):
+    """Download a request profile as speedscope JSON or folded stacks (Admin only)"""
+    if format not in ("speedscope", "folded", "raw"):
+        raise HTTPException(status_code=400, detail="Invalid format. Must be one of: ['speedscope', 'folded', 'raw']")
+    profile = await db.profiles.find_one({"id": profile_id}, {"_id": 0})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return Response(
+            to_folded(profile),
+            media_type="text/plain",
+            headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.folded"}
+        )
+    if format == "speedscope":
+        return JSONResponse(
+            to_speedscope(profile),
+            headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.speedscope.json"}
+        )
+    return profile
+
+# ============ QUERY STATS ============
+
+QUERY_SHAPE_SORTS = ["total_ms", "avg_ms", "max_ms", "count", "slow", "avg_docs_returned", "max_docs_returned"]
+
+@api_router.get("/admin/mongo/slow")
+async def get_slow_commands(limit: int = 50, admin: bool = Depends(verify_admin)):
+    """Recent slow Mongo commands on this worker with their explain summaries (Admin only)"""
+    return {"threshold_ms": SLOW_COMMAND_MS, "commands": query_stats.recent_slow(min(max(limit, 1), SLOW_COMMAND_LOG_SIZE))}
+
+@api_router.get("/admin/mongo/shapes")
+async def get_query_shapes(sort: str = "total_ms", limit: int = 50, admin: bool = Depends(verify_admin)):
+    """Aggregated statistics per query shape on this worker (Admin only)"""
+    if sort not in QUERY_SHAPE_SORTS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort. Must be one of: {QUERY_SHAPE_SORTS}")
+    return query_stats.shape_stats(sort, min(max(limit, 1), 500))
+
+@api_router.post("/admin/mongo/shapes/reset")
+async def reset_query_shapes(admin: bool = Depends(verify_admin)):
+    """Clear this worker's query statistics and slow log (Admin only)"""
+    query_stats.reset()
+    return {"message": "Query statistics reset"}
+
 # ============ MERCHANDISE ============
 
 @api_router.get("/merchandise")
 async def get_merchandise():
     """Get all available merchandise"""
-    products = await db.products.find({"is_active": True}, {"_id": 0}).to_list(100)
-    if not products:
-        # Return default products if none in DB
-        return DEFAULT_MERCHANDISE
-    
-    # Convert to dict format and merge with defaults
-    db_products = {p["product_type"]: p for p in products}
-    
-    # Ensure all default products are available
-    result = {}
-    for product_type, default_product in DEFAULT_MERCHANDISE.items():
-        if product_type in db_products:
-            result[product_type] = db_products[product_type]
-        else:
-            result[product_type] = default_product
-    
-    return result
+    return await get_catalog()
 
 @api_router.get("/merchandise/list")
 async def get_merchandise_list():
@@ -447,23 +1262,45 @@ async def create_product(product_data: ProductCreate, admin: bool = Depends(veri
         sizes=product_data.sizes,
         image_type=product_data.image_type,
         image_url=product_data.image_url,
-        created_at=datetime.now(timezone.utc).isoformat(),
+        stock=product_data.stock,
+        size_stock=product_data.size_stock,
+        created_at=datetime.now(timezone.utc),
         is_active=True
     )
     
     doc = product.model_dump()
     await db.products.insert_one(doc)
+    await caches.invalidate("catalog")
+    return product
+
+@api_router.put("/merchandise/{product_type}/stock")
+async def set_product_stock(product_type: str, stock_data: StockUpdate, admin: bool = Depends(verify_admin)):
+    """Set stock counters for a product (Admin only)"""
+    if stock_data.size_stock and any(count < 0 for count in stock_data.size_stock.values()):
+        raise HTTPException(status_code=400, detail="Stock cannot be negative")
+    
+    product = await db.products.find_one_and_update(
+        {"product_type": product_type},
+        {"$set": {"stock": stock_data.stock, "size_stock": stock_data.size_stock}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    await caches.invalidate("catalog")
     return product
 
 @api_router.delete("/merchandise/{product_id}")
-async def delete_product(product_id: str, admin: bool = Depends(verify_admin)):
+async def delete_product(product_id: uuid.UUID, admin: bool = Depends(verify_admin)):
     """Delete a product (Admin only)"""
-    result = await db.products.delete_one({"id": product_id})
+    result = await db.products.delete_one({"id": id_match(product_id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    await caches.invalidate("catalog")
     return {"message": "Product deleted successfully"}
 
 @api_router.get("/merchandise/{product_type}")
+@cached_response(merchandise_responses, key=lambda product_type: product_type)
 async def get_merchandise_item(product_type: str):
     """Get specific merchandise item"""
     product = await db.products.find_one({"product_type": product_type, "is_active": True}, {"_id": 0})
@@ -476,32 +1313,23 @@ async def get_merchandise_item(product_type: str):
 # ============ ORDERS ============
 
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate):
+async def create_order(order_data: OrderCreate, idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")):
     """Create a new merchandise order"""
-    # Verify guardian exists
-    guardian = await db.guardians.find_one(
-        {"scroll_id": order_data.scroll_id.upper()},
-        {"_id": 0}
+    return await run_idempotent(
+        "orders.create",
+        idempotency_key,
+        order_data.model_dump(),
+        lambda: place_order(order_data)
     )
-    if not guardian:
+
+async def place_order(order_data: OrderCreate) -> Order:
+    """Reserve stock and store a new order"""
+    # Verify guardian exists
+    if not await scroll_id_exists(order_data.scroll_id.upper()):
         raise HTTPException(status_code=404, detail="Guardian not found. Please register first.")
     
     # Get available merchandise
-    products = await db.products.find({"is_active": True}, {"_id": 0}).to_list(100)
-    if not products:
-        # Use default products if none in DB
-        merchandise = DEFAULT_MERCHANDISE
-    else:
-        # Convert to dict format and merge with defaults
-        db_products = {p["product_type"]: p for p in products}
-        
-        # Ensure all default products are available
-        merchandise = {}
-        for product_type, default_product in DEFAULT_MERCHANDISE.items():
-            if product_type in db_products:
-                merchandise[product_type] = db_products[product_type]
-            else:
-                merchandise[product_type] = default_product
+    merchandise = await get_catalog()
     
     # Calculate total
     total = 0.0
@@ -518,9 +1346,30 @@ async def create_order(order_data: OrderCreate):
             "size": item.size,
             "quantity": item.quantity,
             "price": product["price"],
-            "item_total": item_total
+            "item_total": item_total,
+            "stock_field": stock_counter_field(product, item.size)
         })
     
+    # Reserve stock with conditional decrements; a failed reservation rolls back the earlier ones
+    reserved = []
+    for item in items_with_details:
+        if not item["stock_field"]:
+            continue
+        reservation = await db.products.find_one_and_update(
+            {
+                "product_type": item["product_type"],
+                "is_active": True,
+                item["stock_field"]: {"$gte": item["quantity"]}
+            },
+            {"$inc": {item["stock_field"]: -item["quantity"]}},
+            projection={"_id": 1}
+        )
+        if not reservation:
+            await release_stock(reserved)
+            size = f" (size {item['size']})" if item["size"] else ""
+            raise HTTPException(status_code=409, detail=f"{item['product_name']}{size} is out of stock")
+        reserved.append(item)
+    
     order = Order(
         scroll_id=order_data.scroll_id.upper(),
         email=order_data.email,
@@ -534,11 +1383,17 @@ async def create_order(order_data: OrderCreate):
         shipping_country=order_data.shipping_country,
         notes=order_data.notes,
         status="pending",
-        created_at=datetime.now(timezone.utc).isoformat()
+        status_history=[status_history_entry(None, "pending")],
+        created_at=datetime.now(timezone.utc)
     )
     
     doc = order.model_dump()
-    await db.orders.insert_one(doc)
+    try:
+        await db.orders.insert_one(doc)
+    except Exception:
+        await release_stock(reserved)
+        raise
+    guardian_profiles.delete(order.scroll_id)
     
     return order
 
@@ -549,138 +1404,703 @@ async def get_orders(admin: bool = Depends(verify_admin)):
     return [Order(**o) for o in orders]
 
 @api_router.get("/orders/{order_id}")
-async def get_order(order_id: str):
+async def get_order(order_id: uuid.UUID):
     """Get specific order"""
-    order = await db.orders.find_one({"id": order_id}, {"_id": 0})
+    order = await db.orders.find_one({"id": id_match(order_id)}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return Order(**order)
 
+async def verify_guardian_access(scroll_id: str, credentials: HTTPBasicCredentials = Depends(security)) -> str:
+    """Admin, or the guardian signing in with Scroll ID and password; returns the normalized Scroll ID"""
+    scroll_id = scroll_id.upper()
+    if not await guardian_authorized(scroll_id, credentials):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if not await scroll_id_exists(scroll_id):
+        raise HTTPException(status_code=404, detail="Guardian not found")
+    return scroll_id
+
+@api_router.get("/guardians/{scroll_id}/orders", response_model=OrderPage)
+async def get_guardian_orders(scroll_id: str = Depends(verify_guardian_access), cursor: Optional[str] = None,
+                              limit: int = 20):
+    """A guardian's orders, newest first; item detail comes from /guardians/{scroll_id}/orders/{order_id}/items"""
+    limit = min(max(limit, 1), 100)
+    
+    query = {"scroll_id": scroll_id}
+    if cursor:
+        created_at, order_id = decode_cursor(cursor, (datetime, str), (uuid.UUID, str))
+        query.update(keyset_after(created_at, order_id))
+    orders = await db.orders.find(
+        query, {"_id": 0, "id": 1, "status": 1, "total_amount": 1, "created_at": 1}
+    ).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = encode_cursor(orders[-1]["created_at"], orders[-1]["id"])
+    return OrderPage(orders=[OrderSummary(**o) for o in orders], next_cursor=next_cursor)
+
+@api_router.get("/guardians/{scroll_id}/orders/{order_id}/items")
+async def get_guardian_order_items(order_id: uuid.UUID, scroll_id: str = Depends(verify_guardian_access)):
+    """Line items of one of a guardian's orders"""
+    order = await db.orders.find_one({"id": id_match(order_id), "scroll_id": scroll_id}, {"_id": 0, "id": 1, "items": 1})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return {**order, "items": public_items(order["items"])}
+
+@api_router.post("/orders/status/bulk")
+async def bulk_update_order_status(update: OrderStatusBulkUpdate, admin: bool = Depends(verify_admin)):
+    """Move many orders to a new status at once (Admin only)"""
+    if update.status not in ORDER_STATUS_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {list(ORDER_STATUS_TRANSITIONS)}")
+    
+    order_ids = list(dict.fromkeys(update.order_ids))
+    current = await db.orders.find(
+        {"id": id_match(*order_ids)},
+        {"_id": 0, "id": 1, "status": 1, "created_at": 1}
+    ).to_list(len(order_ids))
+    
+    # Group orders by their current status so each transition is one conditional update
+    by_status = {}
+    for order in current:
+        by_status.setdefault(order["status"], []).append(order["id"])
+    
+    found_ids = {as_uuid(order["id"]) for order in current}
+    not_found = [order_id for order_id in order_ids if order_id not in found_ids]
+    rejected = []
+    transitions = {}
+    moved_ids = []
+    updated = 0
+    conflicts = 0
+    
+    for from_status, ids in by_status.items():
+        if from_status not in allowed_previous_statuses(update.status):
+            rejected.extend({"id": order_id, "status": from_status} for order_id in ids)
+            continue
+        result = await db.orders.update_many(
+            {"id": {"$in": ids}, "status": from_status},
+            {
+                "$set": {"status": update.status},
+                "$push": {"status_history": status_history_entry(from_status, update.status)}
+            }
+        )
+        transitions[f"{from_status}->{update.status}"] = result.modified_count
+        updated += result.modified_count
+        if result.modified_count:
+            moved_ids.extend(ids)
+        # Orders that changed status between the read and the update are left untouched
+        conflicts += len(ids) - result.modified_count
+    
+    if updated:
+        if update.status == "cancelled":
+            # Orders that raced to another status in between are skipped by the claim's status check
+            await release_cancelled_order_stock(moved_ids)
+        await invalidate_sales_days([order["created_at"] for order in current])
+    
+    return {
+        "message": "Order statuses updated",
+        "status": update.status,
+        "updated": updated,
+        "transitions": transitions,
+        "rejected": rejected,
+        "not_found": not_found,
+        "conflicts": conflicts
+    }
+
 @api_router.patch("/orders/{order_id}/status")
-async def update_order_status(order_id: str, status: str, admin: bool = Depends(verify_admin)):
+async def update_order_status(order_id: uuid.UUID, status: str, admin: bool = Depends(verify_admin)):
     """Update order status (Admin only)"""
-    valid_statuses = ["pending", "processing", "shipped", "delivered", "cancelled"]
-    if status not in valid_statuses:
-        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {valid_statuses}")
+    if status not in ORDER_STATUS_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {list(ORDER_STATUS_TRANSITIONS)}")
+    
+    order = await db.orders.find_one({"id": id_match(order_id)}, {"_id": 0, "status": 1, "created_at": 1})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    
+    from_status = order["status"]
+    if from_status not in allowed_previous_statuses(status):
+        raise HTTPException(status_code=400, detail=f"Cannot change order status from {from_status} to {status}")
     
     result = await db.orders.update_one(
-        {"id": order_id},
-        {"$set": {"status": status}}
+        {"id": id_match(order_id), "status": from_status},
+        {
+            "$set": {"status": status},
+            "$push": {"status_history": status_history_entry(from_status, status)}
+        }
     )
     if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Order not found")
+        raise HTTPException(status_code=409, detail="Order status changed concurrently, please retry")
+    if status == "cancelled":
+        await release_cancelled_order_stock([order_id])
+    await invalidate_sales_days([order["created_at"]])
     return {"message": "Order status updated", "status": status}
 
 @api_router.delete("/orders/{order_id}")
-async def delete_order(order_id: str, admin: bool = Depends(verify_admin)):
+async def delete_order(order_id: uuid.UUID, admin: bool = Depends(verify_admin)):
     """Delete an order (Admin only)"""
-    result = await db.orders.delete_one({"id": order_id})
-    if result.deleted_count == 0:
+    order = await db.orders.find_one_and_delete(
+        {"id": id_match(order_id)}, {"_id": 0, "status": 1, "items": 1, "stock_released": 1, "created_at": 1}
+    )
+    if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    # Open orders still hold their reserved units; shipped ones used them, cancelled ones gave them back
+    if order["status"] in ("pending", "processing") or (
+        order["status"] == "cancelled" and not order.get("stock_released")
+    ):
+        await release_stock(order["items"])
+    await invalidate_sales_days([order["created_at"]])
     return {"message": "Order deleted successfully"}
 
+# ============ ANALYTICS ============
+
+def sales_day_key(created_at) -> str:
+    """Get the UTC day (YYYY-MM-DD) an order timestamp belongs to"""
+    if isinstance(created_at, str):
+        # Orders not yet converted by the timestamps_migrate job
+        return created_at[:10]
+    return created_at.astimezone(timezone.utc).date().isoformat()
+
+def day_start(day: date) -> datetime:
+    """Midnight UTC at the start of day"""
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+async def invalidate_sales_days(created_ats: List[datetime]):
+    """Drop materialized sales rollups for days whose orders changed"""
+    days = list({sales_day_key(c) for c in created_ats if c})
+    if days:
+        await db.sales_daily.delete_many({"day": {"$in": days}})
+
+async def aggregate_sales_days(start_day: date, end_day: date) -> dict:
+    """Aggregate orders created in [start_day, end_day] into per-day rollups"""
+    day_expr = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}}  # Dates render in UTC
+    pipeline = [
+        {"$match": {"created_at": {
+            "$gte": day_start(start_day),
+            "$lt": day_start(end_day + timedelta(days=1))
+        }}},
+        {"$facet": {
+            "orders": [
+                {"$group": {
+                    "_id": {"day": day_expr, "status": "$status"},
+                    "orders": {"$sum": 1},
+                    "revenue": {"$sum": "$total_amount"}
+                }}
+            ],
+            "items": [
+                {"$unwind": "$items"},
+                {"$group": {
+                    "_id": {
+                        "day": day_expr,
+                        "status": "$status",
+                        "product_type": "$items.product_type",
+                        "size": "$items.size"
+                    },
+                    "units": {"$sum": "$items.quantity"},
+                    "revenue": {"$sum": "$items.item_total"}
+                }}
+            ]
+        }}
+    ]
+    result = await db.orders.aggregate(pipeline).to_list(1)
+    facets = result[0] if result else {"orders": [], "items": []}
+    
+    rollups = {}
+    def rollup(day: str) -> dict:
+        if day not in rollups:
+            rollups[day] = {"day": day, "orders": 0, "units": 0, "revenue": 0.0,
+                            "by_status": {}, "by_product": {}, "by_size": {}}
+        return rollups[day]
+    
+    for row in facets["orders"]:
+        day_rollup = rollup(row["_id"]["day"])
+        status = row["_id"]["status"]
+        by_status = day_rollup["by_status"].setdefault(status, {"orders": 0, "units": 0, "revenue": 0.0})
+        by_status["orders"] += row["orders"]
+        by_status["revenue"] += row["revenue"]
+        if status != "cancelled":
+            day_rollup["orders"] += row["orders"]
+            day_rollup["revenue"] += row["revenue"]
+    
+    for row in facets["items"]:
+        key = row["_id"]
+        day_rollup = rollup(key["day"])
+        day_rollup["by_status"].setdefault(key["status"], {"orders": 0, "units": 0, "revenue": 0.0})["units"] += row["units"]
+        # Cancelled orders count toward their status bucket only
+        if key["status"] == "cancelled":
+            continue
+        day_rollup["units"] += row["units"]
+        for group, name in (("by_product", key["product_type"]), ("by_size", key.get("size") or "one_size")):
+            bucket = day_rollup[group].setdefault(name, {"units": 0, "revenue": 0.0})
+            bucket["units"] += row["units"]
+            bucket["revenue"] += row["revenue"]
+    
+    return rollups
+
+def empty_sales_day(day: str) -> dict:
+    """Build the rollup for a day without orders"""
+    return {"day": day, "orders": 0, "units": 0, "revenue": 0.0,
+            "by_status": {}, "by_product": {}, "by_size": {}}
+
+async def get_sales_series(start_day: date, end_day: date) -> List[dict]:
+    """Get daily sales rollups, materializing closed days in db.sales_daily"""
+    today = datetime.now(timezone.utc).date()
+    closed_end = min(end_day, today - timedelta(days=1))
+    series = {}
+    
+    if start_day <= closed_end:
+        cached = await db.sales_daily.find(
+            {"day": {"$gte": start_day.isoformat(), "$lte": closed_end.isoformat()}},
+            {"_id": 0}
+        ).to_list(None)
+        series.update({r["day"]: r for r in cached})
+        
+        missing = [
+            start_day + timedelta(days=i)
+            for i in range((closed_end - start_day).days + 1)
+            if (start_day + timedelta(days=i)).isoformat() not in series
+        ]
+        if missing:
+            # One pipeline over the span of missing days, then one bulk write materializing each closed day
+            computed = await aggregate_sales_days(missing[0], missing[-1])
+            now = datetime.now(timezone.utc)
+            upserts = []
+            for day in missing:
+                key = day.isoformat()
+                day_rollup = computed.get(key) or empty_sales_day(key)
+                upserts.append(ReplaceOne({"day": key}, {**day_rollup, "computed_at": now}, upsert=True))
+                series[key] = day_rollup
+            await db.sales_daily.bulk_write(upserts, ordered=False)
+    
+    # The current day is still open and always aggregated live
+    if start_day <= today <= end_day:
+        live = await aggregate_sales_days(today, today)
+        series[today.isoformat()] = live.get(today.isoformat()) or empty_sales_day(today.isoformat())
+    
+    return [
+        {k: v for k, v in series[key].items() if k != "computed_at"}
+        for key in sorted(series)
+    ]
+
+@api_router.get("/admin/analytics/sales")
+async def get_sales_analytics(start: Optional[date] = None, end: Optional[date] = None, admin: bool = Depends(verify_admin)):
+    """Get daily revenue and unit series with product, size and status breakdowns (Admin only)"""
+    today = datetime.now(timezone.utc).date()
+    end = min(end or today, today)
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must be on or before end")
+    if (end - start).days > 366:
+        raise HTTPException(status_code=400, detail="Date range cannot exceed 366 days")
+    
+    series = await get_sales_series(start, end)
+    
+    totals = {"orders": 0, "units": 0, "revenue": 0.0, "by_product": {}, "by_size": {}, "by_status": {}}
+    for day in series:
+        for field in ("orders", "units", "revenue"):
+            totals[field] += day[field]
+        for group in ("by_product", "by_size", "by_status"):
+            for name, values in day[group].items():
+                bucket = totals[group].setdefault(name, {})
+                for field, value in values.items():
+                    bucket[field] = bucket.get(field, 0) + value
+    
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "totals": totals,
+        "series": series
+    }
+
+# ============ BACKGROUND JOBS ============
+
+job_runner = JobRunner(concurrency=JOB_WORKERS)
+
+ORDER_EXPORT_FIELDS = [
+    "id", "created_at", "status", "scroll_id", "email", "total_amount", "items",
+    "shipping_name", "shipping_address", "shipping_city", "shipping_state",
+    "shipping_zip", "shipping_country", "notes"
+]
+
+@job_runner.register("orders_export")
+async def export_orders_job(ctx: JobContext):
+    """Export every order as CSV, resuming from the last exported document"""
+    # _id order: ids are a mix of strings and binary UUIDs until uuids_migrate has run
+    last_id = ctx.checkpoint.get("last_object_id")
+    exported = ctx.checkpoint.get("exported", 0)
+    total = await db.orders.count_documents({})
+    
+    if last_id is None:
+        header = io.StringIO()
+        csv.writer(header).writerow(ORDER_EXPORT_FIELDS)
+        await ctx.write_output(header.getvalue())
+    
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        batch = await db.orders.find(query).sort("_id", 1).to_list(500)
+        if not batch:
+            break
+        
+        rows = io.StringIO()
+        writer = csv.writer(rows)
+        for order in batch:
+            items = "; ".join(
+                f"{item['quantity']}x {item['product_type']}" + (f" ({item['size']})" if item.get("size") else "")
+                for item in order.get("items", [])
+            )
+            writer.writerow([
+                items if field == "items" else timestamp_iso(order["created_at"]) if field == "created_at" else order.get(field)
+                for field in ORDER_EXPORT_FIELDS
+            ])
+        await ctx.write_output(rows.getvalue())
+        
+        last_id = batch[-1]["_id"]
+        exported += len(batch)
+        await ctx.save_checkpoint({"last_object_id": last_id, "exported": exported})
+        await ctx.progress(exported, total)
+    
+    return {"exported": exported, "content_type": "text/csv", "filename": "orders.csv"}
+
+@job_runner.register("sales_rollup_rebuild")
+async def rebuild_sales_rollups_job(ctx: JobContext):
+    """Recompute materialized daily sales rollups for a date range"""
+    today = datetime.now(timezone.utc).date()
+    end = date.fromisoformat(ctx.params["end"]) if ctx.params.get("end") else today
+    start = date.fromisoformat(ctx.params["start"]) if ctx.params.get("start") else end - timedelta(days=365)
+    
+    await db.sales_daily.delete_many({"day": {"$gte": start.isoformat(), "$lte": end.isoformat()}})
+    series = await get_sales_series(start, end)
+    await ctx.progress(len(series), len(series))
+    return {"days": len(series), "start": start.isoformat(), "end": end.isoformat()}
+
+@job_runner.register("certificates_prerender")
+async def prerender_certificates_job(ctx: JobContext):
+    """Render every guardian's certificate into storage on a process pool"""
+    formats = ctx.params.get("formats") or list(CERTIFICATE_FORMATS)
+    force = ctx.params.get("force", False)
+    last_scroll_id = ctx.checkpoint.get("last_scroll_id")
+    counts = ctx.checkpoint.get("counts") or {"rendered": 0, "skipped": 0, "failed": 0}
+    total = await db.guardians.count_documents({})
+    loop = asyncio.get_running_loop()
+    
+    workers = min(int(ctx.params.get("workers") or os.cpu_count() or 1), PRERENDER_MAX_WORKERS)
+    # Spawned workers start clean instead of forking the event loop, Motor client and its threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        while True:
+            query = {"scroll_id": {"$gt": last_scroll_id}} if last_scroll_id else {}
+            batch = await db.guardians.find(
+                query, {"_id": 0, "scroll_id": 1, "registered_at": 1, "is_certified": 1}
+            ).sort("scroll_id", 1).to_list(200)
+            if not batch:
+                break
+            
+            renders = []
+            for guardian in batch:
+                certificate = certificate_data(guardian)
+                for fmt in formats:
+                    key = certificate_key(certificate, fmt)
+                    if not force and (key in rendered_certificates or await storage.exists(key)):
+                        counts["skipped"] += 1
+                        continue
+                    renders.append((key, fmt, loop.run_in_executor(pool, render_certificate_job, certificate, fmt)))
+            
+            for key, fmt, render in renders:
+                data = await render
+                if data is None:
+                    counts["failed"] += 1
+                    continue
+                await storage.save_stream(key, iter_bytes(data), CERTIFICATE_FORMATS[fmt])
+                rendered_certificates.add(key)
+                counts["rendered"] += 1
+            
+            last_scroll_id = batch[-1]["scroll_id"]
+            await ctx.save_checkpoint({"last_scroll_id": last_scroll_id, "counts": counts})
+            await ctx.progress(sum(counts.values()), total * len(formats))
+    finally:
+        # Joining the workers blocks, so it runs off the loop; queued renders of a failed or cancelled job are dropped
+        await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+    
+    return counts
+
+@job_runner.register("reindex")
+async def reindex_job(ctx: JobContext):
+    """Create any missing indexes"""
+    await ensure_indexes()
+    return {"message": "Indexes ensured"}
+
+@api_router.post("/admin/jobs")
+async def submit_job(job_data: JobCreate, admin: bool = Depends(verify_admin)):
+    """Queue a background job (Admin only)"""
+    if job_data.type not in job_runner.handlers:
+        raise HTTPException(status_code=400, detail=f"Unknown job type. Must be one of: {list(job_runner.handlers)}")
+    return await job_runner.submit(job_data.type, job_data.params)
+
+@api_router.get("/admin/jobs")
+async def list_jobs(status: Optional[str] = None, limit: int = 50, admin: bool = Depends(verify_admin)):
+    """List recent background jobs (Admin only)"""
+    if status and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status. Must be one of: {JOB_STATUSES}")
+    query = {"status": status} if status else {}
+    return await db.jobs.find(
+        query, {"_id": 0, "result": 0, "checkpoint": 0, "lease_expires_at": 0}
+    ).sort("created_at", -1).to_list(min(max(limit, 1), 200))
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_job(job_id: str, admin: bool = Depends(verify_admin)):
+    """Get a background job's status and progress (Admin only)"""
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "checkpoint": 0, "lease_expires_at": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/admin/jobs/{job_id}/result")
+async def get_job_result(job_id: str, admin: bool = Depends(verify_admin)):
+    """Fetch a finished job's result or download its output (Admin only)"""
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0, "status": 1, "result": 1, "error": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Job failed: {job['error']}")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    
+    result = job.get("result") or {}
+    if result.get("content_type"):
+        return StreamingResponse(
+            job_runner.iter_output(job_id),
+            media_type=result["content_type"],
+            headers={"Content-Disposition": f"attachment; filename={result.get('filename', job_id)}"}
+        )
+    return result
+
+@api_router.post("/admin/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, admin: bool = Depends(verify_admin)):
+    """Cancel a queued or running background job (Admin only)"""
+    job = await job_runner.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"message": "Job cancellation requested", "status": job["status"]}
+
 # ============ FILE UPLOADS ============
 
+async def read_upload_chunks(file: UploadFile):
+    """Stream an uploaded file in chunks, enforcing the size limit as bytes arrive"""
+    size = 0
+    while chunk := await file.read(1024 * 1024):
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail="File too large. Maximum size: 5MB")
+        yield chunk
+
 @api_router.post("/upload/image")
 async def upload_image(file: UploadFile = File(...), admin: bool = Depends(verify_admin)):
     """Upload an image file (Admin only)"""
     # Validate file type
-    allowed_types = ["image/jpeg", "image/png", "image/gif", "image/webp"]
-    if file.content_type not in allowed_types:
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
         raise HTTPException(status_code=400, detail="Invalid file type. Allowed: JPEG, PNG, GIF, WEBP")
     
-    # Validate file size (max 5MB)
-    contents = await file.read()
-    if len(contents) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large. Maximum size: 5MB")
-    
     # Generate unique filename
     ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
     filename = f"{uuid.uuid4()}.{ext}"
-    filepath = UPLOAD_DIR / filename
     
-    # Save file
-    with open(filepath, "wb") as f:
-        f.write(contents)
+    # Stream to the storage backend; oversized files are discarded mid-stream
+    size = await storage.save_stream(filename, read_upload_chunks(file), file.content_type)
     
     # Return the URL path
     return {
         "filename": filename,
         "url": f"/uploads/{filename}",
-        "size": len(contents)
+        "size": size
     }
 
+@api_router.post("/upload/image/presign")
+async def presign_image_upload(content_type: str, ext: str = "jpg", admin: bool = Depends(verify_admin)):
+    """Get a direct-to-storage upload URL so image bytes skip the API (Admin only)"""
+    if content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Allowed: JPEG, PNG, GIF, WEBP")
+    
+    filename = f"{uuid.uuid4()}.{ext.lstrip('.').lower() or 'jpg'}"
+    upload = await storage.upload_url(filename, content_type)
+    if not upload:
+        raise HTTPException(status_code=400, detail="Direct uploads are not supported by the local storage backend")
+    return {
+        "filename": filename,
+        "url": f"/uploads/{filename}",
+        "upload": upload
+    }
+
+@job_runner.register("storage_migrate")
+async def migrate_storage_job(ctx: JobContext):
+    """Copy uploads between storage backends"""
+    async def report(stats: dict):
+        await ctx.progress(stats["copied"] + stats["skipped"] + stats["failed"], message=str(stats))
+    
+    return await migrate_storage(
+        storage_from_env(ctx.params.get("source", "local"), local_root=UPLOAD_DIR),
+        storage_from_env(ctx.params.get("dest", "s3"), local_root=UPLOAD_DIR),
+        prefix=ctx.params.get("prefix", ""),
+        overwrite=ctx.params.get("overwrite", False),
+        on_progress=report
+    )
+
+@job_runner.register("timestamps_migrate")
+async def migrate_timestamps_job(ctx: JobContext):
+    """Convert ISO string timestamps to BSON dates in place"""
+    collections = ctx.params.get("collections") or list(TIMESTAMP_FIELDS)
+    unknown = [name for name in collections if name not in TIMESTAMP_FIELDS]
+    if unknown:
+        raise ValueError(f"No timestamp fields known for: {unknown}")
+    
+    async def report(stats: dict):
+        await ctx.progress(stats["converted"], message=str(stats["collections"]))
+    
+    stats = await migrate_timestamps(
+        db, {name: TIMESTAMP_FIELDS[name] for name in collections},
+        batch_size=int(ctx.params.get("batch_size", 1000)), on_progress=report
+    )
+    return stats
+
+@job_runner.register("uuids_migrate")
+async def migrate_uuids_job(ctx: JobContext):
+    """Convert UUID string ids to binary UUIDs in place, reporting the bytes saved"""
+    collections = ctx.params.get("collections") or list(UUID_FIELDS)
+    unknown = [name for name in collections if name not in UUID_FIELDS]
+    if unknown:
+        raise ValueError(f"No UUID fields known for: {unknown}")
+    
+    async def report(stats: dict):
+        await ctx.progress(stats["converted"], message=str(stats["collections"]))
+    
+    return await migrate_uuids(
+        db, {name: UUID_FIELDS[name] for name in collections},
+        batch_size=int(ctx.params.get("batch_size", 1000)),
+        compact=bool(ctx.params.get("compact", False)),
+        on_progress=report
+    )
+
+# ============ SNAPSHOTS ============
+
+@api_router.get("/admin/snapshot/export")
+async def export_snapshot(collections: Optional[str] = None, exclude_password_hashes: bool = False, admin: bool = Depends(verify_admin)):
+    """Download a gzip NDJSON snapshot of the core collections (Admin only)"""
+    names = collections.split(",") if collections else SNAPSHOT_COLLECTIONS
+    if any(name not in SNAPSHOT_COLLECTIONS for name in names):
+        raise HTTPException(status_code=400, detail=f"Invalid collection. Must be among: {SNAPSHOT_COLLECTIONS}")
+    filename = f"snapshot-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.ndjson.gz"
+    return StreamingResponse(
+        iter_snapshot(db, names, exclude_password_hashes),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+@api_router.post("/admin/snapshot/import")
+async def import_snapshot_upload(file: UploadFile = File(...), mode: str = "upsert", admin: bool = Depends(verify_admin)):
+    """Load an uploaded snapshot in ordered batches (Admin only)"""
+    if mode not in IMPORT_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode. Must be one of: {IMPORT_MODES}")
+    
+    async def chunks():
+        while chunk := await file.read(1024 * 1024):
+            yield chunk
+    
+    try:
+        result = await import_snapshot(db, chunks(), mode)
+    except (ValueError, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {e}")
+    except BulkWriteError as e:
+        raise HTTPException(status_code=409, detail=f"Import stopped at a conflicting document: {e.details.get('writeErrors', [{}])[0].get('errmsg')}")
+    finally:
+        # Whatever was written before a failure is live too
+        await caches.invalidate(None)
+        # Imported orders can land on days whose rollups are already materialized
+        await db.sales_daily.delete_many({})
+        await scroll_ids.load(db.guardians)
+        await seed_scroll_id_counter()
+    return result
+
 # ============ COMMENTS ============
 
 @api_router.post("/comments", response_model=Comment)
 async def create_comment(comment_data: CommentCreate):
     """Create a new comment on a transmission"""
     # Verify guardian exists
-    guardian = await db.guardians.find_one(
-        {"scroll_id": comment_data.scroll_id.upper()},
-        {"_id": 0}
-    )
-    if not guardian:
+    if not await scroll_id_exists(comment_data.scroll_id.upper()):
         raise HTTPException(status_code=404, detail="Guardian not found. Please register first.")
     
     # Verify transmission exists
-    transmission = await db.transmissions.find_one({"id": comment_data.transmission_id})
+    transmission = await loaders["transmissions"].load(comment_data.transmission_id)
     if not transmission:
         raise HTTPException(status_code=404, detail="Transmission not found")
     
     # If it's a reply, verify parent comment exists
     if comment_data.parent_id:
-        parent = await db.comments.find_one({"id": comment_data.parent_id, "is_deleted": False})
+        parent = await db.comments.find_one({"id": id_match(comment_data.parent_id), "is_deleted": False})
         if not parent:
             raise HTTPException(status_code=404, detail="Parent comment not found")
     
+    moderation_status, matched_terms = (await get_moderation()).verdict(comment_data.content)
+    
     comment = Comment(
         transmission_id=comment_data.transmission_id,
         scroll_id=comment_data.scroll_id.upper(),
         content=comment_data.content,
         parent_id=comment_data.parent_id,
-        created_at=datetime.now(timezone.utc).isoformat(),
-        is_deleted=False
+        created_at=datetime.now(timezone.utc),
+        is_deleted=False,
+        moderation_status=moderation_status
     )
     
     doc = comment.model_dump()
-    await db.comments.insert_one(doc)
+    if matched_terms:
+        doc["moderation_terms"] = matched_terms
+    await insert_comment(doc)
+    guardian_profiles.delete(comment.scroll_id)
     return comment
 
 @api_router.get("/comments/{transmission_id}")
-async def get_comments(transmission_id: str):
-    """Get all comments for a transmission"""
+async def get_comments(transmission_id: uuid.UUID, expand: Optional[str] = None):
+    """Get all comments for a transmission; expand=guardian attaches each author's public profile"""
     comments = await db.comments.find(
-        {"transmission_id": transmission_id, "is_deleted": False},
-        {"_id": 0}
+        {"transmission_id": id_match(transmission_id), "is_deleted": False, "moderation_status": {"$ne": "held"}},
+        {"_id": 0, "moderation_terms": 0}
     ).sort("created_at", 1).to_list(500)
+    if expand == "guardian":
+        # One $in query for every distinct author instead of one lookup per comment
+        guardians = await loaders["guardians"].load_many({c["scroll_id"] for c in comments})
+        profiles = {
+            g["scroll_id"]: {"scroll_id": g["scroll_id"], "registered_at": g["registered_at"], "is_certified": g["is_certified"]}
+            for g in guardians if g
+        }
+        for comment in comments:
+            comment["guardian"] = profiles.get(comment["scroll_id"])
     return comments
 
 @api_router.delete("/comments/{comment_id}")
-async def delete_comment(comment_id: str, scroll_id: Optional[str] = None, admin: bool = Depends(verify_admin)):
+async def delete_comment(comment_id: uuid.UUID, scroll_id: Optional[str] = None, admin: bool = Depends(verify_admin)):
     """Delete a comment (Admin only via auth, or owner via scroll_id)"""
     # Admin can delete any comment
     result = await db.comments.update_one(
-        {"id": comment_id},
-        {"$set": {"is_deleted": True}}
+        {"id": id_match(comment_id)},
+        {"$set": {"is_deleted": True, "deleted_at": datetime.now(timezone.utc)}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Comment not found")
     return {"message": "Comment deleted"}
 
 @api_router.delete("/comments/{comment_id}/user")
-async def delete_own_comment(comment_id: str, scroll_id: str):
+async def delete_own_comment(comment_id: uuid.UUID, scroll_id: str):
     """Delete own comment (for guardians)"""
-    comment = await db.comments.find_one({"id": comment_id, "is_deleted": False})
+    comment = await db.comments.find_one({"id": id_match(comment_id), "is_deleted": False})
     if not comment:
         raise HTTPException(status_code=404, detail="Comment not found")
     if comment["scroll_id"] != scroll_id.upper():
         raise HTTPException(status_code=403, detail="You can only delete your own comments")
     
     await db.comments.update_one(
-        {"id": comment_id},
-        {"$set": {"is_deleted": True}}
+        {"id": id_match(comment_id), "is_deleted": False},
+        {"$set": {"is_deleted": True, "deleted_at": datetime.now(timezone.utc)}}
     )
+    guardian_profiles.delete(comment["scroll_id"])
     return {"message": "Comment deleted"}
 
 @api_router.post("/comments/admin", response_model=Comment)
@@ -691,12 +2111,13 @@ async def admin_create_comment(comment_data: CommentCreate, admin: bool = Depend
         scroll_id=comment_data.scroll_id.upper() if comment_data.scroll_id else "ADMIN",
         content=comment_data.content,
         parent_id=comment_data.parent_id,
-        created_at=datetime.now(timezone.utc).isoformat(),
+        created_at=datetime.now(timezone.utc),
         is_deleted=False
     )
     
     doc = comment.model_dump()
-    await db.comments.insert_one(doc)
+    await insert_comment(doc)
+    guardian_profiles.delete(comment.scroll_id)
     return comment
 
 @api_router.get("/comments/all/admin")
@@ -705,19 +2126,219 @@ async def get_all_comments(admin: bool = Depends(verify_admin)):
     comments = await db.comments.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
     return comments
 
-# Include the router in the main app
-app.include_router(api_router)
+def as_utc(value: datetime) -> datetime:
+    """Naive query parameters are taken as UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+def comment_filter_query(comment_filter: CommentFilter) -> dict:
+    query = {}
+    if comment_filter.transmission_id:
+        query["transmission_id"] = id_match(comment_filter.transmission_id)
+    if comment_filter.scroll_id:
+        query["scroll_id"] = comment_filter.scroll_id.upper()
+    if comment_filter.since or comment_filter.until:
+        query["created_at"] = {}
+        if comment_filter.since:
+            query["created_at"]["$gte"] = as_utc(comment_filter.since)
+        if comment_filter.until:
+            query["created_at"]["$lt"] = as_utc(comment_filter.until)
+    if comment_filter.deleted is not None:
+        query["is_deleted"] = comment_filter.deleted
+    return query
+
+@api_router.get("/admin/comments")
+async def get_comment_feed(
+    transmission_id: Optional[uuid.UUID] = None,
+    scroll_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    deleted: Optional[bool] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    admin: bool = Depends(verify_admin)
+):
+    """Filterable comment feed for moderation, newest first, paged by cursor (Admin only)"""
+    limit = min(max(limit, 1), 200)
+    query = comment_filter_query(CommentFilter(
+        transmission_id=transmission_id, scroll_id=scroll_id, since=since, until=until, deleted=deleted
+    ))
+    if cursor:
+        created_at, comment_id = decode_cursor(cursor, (datetime, str), (uuid.UUID, str))
+        query = {"$and": [query, keyset_after(created_at, comment_id)]}
+    comments = await db.comments.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(comments) > limit:
+        comments = comments[:limit]
+        next_cursor = encode_cursor(comments[-1]["created_at"], comments[-1]["id"])
+    return {"comments": comments, "next_cursor": next_cursor}
+
+def comment_bulk_query(action: CommentBulkAction) -> dict:
+    if (action.comment_ids is None) == (action.filter is None):
+        raise HTTPException(status_code=400, detail="Provide either comment_ids or filter")
+    if action.comment_ids is not None:
+        return {"id": id_match(*action.comment_ids)}
+    query = comment_filter_query(action.filter.model_copy(update={"deleted": None}))
+    if not query:
+        raise HTTPException(status_code=400, detail="Filter must set at least one of transmission_id, scroll_id, since or until")
+    return query
+
+@api_router.post("/admin/comments/bulk-delete")
+async def bulk_delete_comments(action: CommentBulkAction, admin: bool = Depends(verify_admin)):
+    """Soft-delete comments by id list or filter in one update (Admin only)"""
+    result = await db.comments.update_many(
+        {**comment_bulk_query(action), "is_deleted": False},
+        {"$set": {"is_deleted": True, "deleted_at": datetime.now(timezone.utc)}}
+    )
+    await caches.invalidate("guardian_profiles")
+    return {"matched": result.matched_count, "deleted": result.modified_count}
+
+@api_router.post("/admin/comments/bulk-restore")
+async def bulk_restore_comments(action: CommentBulkAction, admin: bool = Depends(verify_admin)):
+    """Restore soft-deleted comments by id list or filter in one update (Admin only)"""
+    # Comments a moderator rejected stay down; only hand-deleted ones come back
+    result = await db.comments.update_many(
+        {**comment_bulk_query(action), "is_deleted": True, "moderation_status": {"$ne": "rejected"}},
+        {"$set": {"is_deleted": False}, "$unset": {"deleted_at": ""}}
+    )
+    await caches.invalidate("guardian_profiles")
+    return {"matched": result.matched_count, "restored": result.modified_count}
+
+# ============ MODERATION ============
+
+@api_router.get("/admin/moderation/terms")
+async def list_moderation_terms(admin: bool = Depends(verify_admin)):
+    """List blocked terms (Admin only)"""
+    return await db.moderation_terms.find({}, {"_id": 0}).sort("term", 1).to_list(None)
+
+@api_router.post("/admin/moderation/terms")
+async def add_moderation_term(term_data: ModerationTermCreate, admin: bool = Depends(verify_admin)):
+    """Add a blocked term; every worker rebuilds its automaton once (Admin only)"""
+    if term_data.action not in MODERATION_ACTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid action. Must be one of: {MODERATION_ACTIONS}")
+    term = {
+        "id": str(uuid.uuid4()),
+        "term": term_data.term.strip().lower(),
+        "action": term_data.action,
+        "whole_word": term_data.whole_word,
+        "created_at": datetime.now(timezone.utc)
+    }
+    try:
+        await db.moderation_terms.insert_one(term)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Term already exists")
+    await caches.invalidate("moderation")
+    term.pop("_id", None)
+    return term
+
+@api_router.delete("/admin/moderation/terms/{term_id}")
+async def delete_moderation_term(term_id: str, admin: bool = Depends(verify_admin)):
+    """Remove a blocked term (Admin only)"""
+    result = await db.moderation_terms.delete_one({"id": term_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Term not found")
+    await caches.invalidate("moderation")
+    return {"message": "Term deleted"}
+
+@api_router.get("/admin/moderation/queue")
+async def get_moderation_queue(status: str = "held", limit: int = 100, admin: bool = Depends(verify_admin)):
+    """Comments awaiting review, oldest first (Admin only)"""
+    if status not in ("held", "flagged"):
+        raise HTTPException(status_code=400, detail="Invalid status. Must be one of: ['held', 'flagged']")
+    return await db.comments.find(
+        {"moderation_status": status, "is_deleted": False},
+        {"_id": 0}
+    ).sort("created_at", 1).to_list(min(max(limit, 1), 500))
 
-# Mount static files for uploads
-app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
+@api_router.post("/admin/moderation/comments/{comment_id}/approve")
+async def approve_comment(comment_id: uuid.UUID, admin: bool = Depends(verify_admin)):
+    """Publish a held or flagged comment (Admin only)"""
+    result = await db.comments.update_one(
+        {"id": id_match(comment_id), "moderation_status": {"$in": ["held", "flagged"]}},
+        {"$set": {"moderation_status": "approved"}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Comment not found in the moderation queue")
+    return {"message": "Comment approved"}
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@api_router.post("/admin/moderation/comments/{comment_id}/reject")
+async def reject_comment(comment_id: uuid.UUID, admin: bool = Depends(verify_admin)):
+    """Delete a held or flagged comment (Admin only)"""
+    result = await db.comments.update_one(
+        {"id": id_match(comment_id), "moderation_status": {"$in": ["held", "flagged"]}},
+        {"$set": {
+            "moderation_status": "rejected",
+            "is_deleted": True,
+            "deleted_at": datetime.now(timezone.utc)
+        }}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Comment not found in the moderation queue")
+    return {"message": "Comment rejected"}
+
+def compactable_comments_query(cutoff: datetime) -> dict:
+    """Comments soft-deleted before cutoff; rows deleted before deleted_at existed go by created_at"""
+    return {
+        "is_deleted": True,
+        "$or": [
+            {"deleted_at": {"$lt": cutoff}},
+            {"deleted_at": {"$exists": False}, "created_at": {"$lt": cutoff}}
+        ]
+    }
+
+@job_runner.register("comments_compact")
+async def compact_comments_job(ctx: JobContext):
+    """Move long-deleted comments into comments_archive, reporting what was reclaimed"""
+    older_than_days = int(ctx.params.get("older_than_days", COMMENT_ARCHIVE_AFTER_DAYS))
+    batch_size = int(ctx.params.get("batch_size", 500))
+    cutoff = ctx.checkpoint.get("cutoff") or (
+        datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    ).isoformat()
+    archived = ctx.checkpoint.get("archived", 0)
+    bytes_reclaimed = ctx.checkpoint.get("bytes_reclaimed", 0)
+    query = compactable_comments_query(datetime.fromisoformat(cutoff))
+    total = archived + await db.comments.count_documents(query)
+    
+    while True:
+        batch = await db.comments.find(query).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        archived_at = datetime.now(timezone.utc)
+        try:
+            await db.comments_archive.insert_many(
+                [{**doc, "archived_at": archived_at} for doc in batch], ordered=False
+            )
+        except BulkWriteError as e:
+            # A run interrupted between insert and delete leaves copies already archived
+            if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+        
+        ids = [doc["_id"] for doc in batch]
+        result = await db.comments.delete_many({"_id": {"$in": ids}, "is_deleted": True})
+        if result.deleted_count < len(ids):
+            # Restored while being archived: the live row wins
+            restored = await db.comments.distinct("_id", {"_id": {"$in": ids}})
+            await db.comments_archive.delete_many({"_id": {"$in": restored}})
+            batch = [doc for doc in batch if doc["_id"] not in set(restored)]
+        
+        archived += len(batch)
+        bytes_reclaimed += sum(len(bson.encode(doc, codec_options=db.codec_options)) for doc in batch)
+        await ctx.save_checkpoint({"cutoff": cutoff, "archived": archived, "bytes_reclaimed": bytes_reclaimed})
+        await ctx.progress(archived, total)
+    
+    return {"archived": archived, "bytes_reclaimed": bytes_reclaimed, "cutoff": cutoff}
+
+@api_router.post("/admin/comments/compact")
+async def compact_comments(older_than_days: int = COMMENT_ARCHIVE_AFTER_DAYS, admin: bool = Depends(verify_admin)):
+    """Queue archival of comments deleted more than older_than_days ago (Admin only)"""
+    if older_than_days < 0:
+        raise HTTPException(status_code=400, detail="older_than_days must not be negative")
+    return await job_runner.submit("comments_compact", {"older_than_days": older_than_days})
+
+# ============ APP FACTORY ============
 
 # Configure logging
 logging.basicConfig(
@@ -726,6 +2347,160 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+async def ensure_unique_index(collection, field: str):
+    """Create a unique index on field, replacing an existing non-unique one
+
+    Registration has no duplicate pre-check and relies on this index, so
+    startup fails while duplicate values exist rather than serving without it.
+    """
+    try:
+        try:
+            await collection.create_index(field, unique=True)
+        except OperationFailure as e:
+            if e.code not in (85, 86):  # IndexOptionsConflict, IndexKeySpecsConflict
+                raise
+            await collection.drop_index(f"{field}_1")
+            try:
+                await collection.create_index(field, unique=True)
+            except DuplicateKeyError:
+                # Put the non-unique index back so lookups are not left without one
+                await collection.create_index(field)
+                raise
+    except DuplicateKeyError as e:
+        raise RuntimeError(
+            f"Cannot create unique index on {collection.name}.{field}: duplicate values exist, merge them before starting"
+        ) from e
+
+async def ensure_indexes():
+    """Create the indexes the query paths rely on"""
+    await ensure_unique_index(db.guardians, "scroll_id")
+    await ensure_unique_index(db.guardians, "email")
+    await db.orders.create_index("id")
+    await db.orders.create_index("created_at")
+    await db.orders.create_index([("scroll_id", 1), ("created_at", -1), ("id", -1)])
+    await db.products.create_index("product_type")
+    await db.comments.create_index("id")
+    # Hot comment reads only ever look at live rows, so deleted ones stay out of the index
+    await db.comments.create_index(
+        [("transmission_id", 1), ("created_at", 1)],
+        partialFilterExpression={"is_deleted": False}
+    )
+    await db.comments.create_index([("scroll_id", 1), ("created_at", -1)])
+    await db.comments.create_index([("created_at", -1), ("id", -1)])
+    await db.comments.create_index(
+        [("moderation_status", 1), ("created_at", 1)],
+        partialFilterExpression={"moderation_status": {"$exists": True}}
+    )
+    await db.moderation_terms.create_index("term", unique=True)
+    await db.comments.create_index(
+        [("deleted_at", 1)],
+        partialFilterExpression={"is_deleted": True}
+    )
+    await db.sales_daily.create_index("day", unique=True)
+    await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+    await db.profiles.create_index("id")
+    await db.profiles.create_index("created_at", expireAfterSeconds=PROFILE_TTL_SECONDS)
+    await job_runner.ensure_indexes()
+
+async def open_database():
+    """Connect to MongoDB and open pool connections before taking traffic"""
+    global client, db
+    client = AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        tz_aware=True,  # Stored timestamps come back as UTC-aware datetimes
+        uuidRepresentation="standard",  # uuid.UUID ids are stored as 16-byte BSON binary
+        event_listeners=[MongoProfileListener(), query_stats]
+    )
+    db = client[os.environ['DB_NAME']]
+    query_stats.bind(client, asyncio.get_running_loop())
+    # Concurrent pings each check out their own connection, filling the pool
+    await asyncio.gather(*[client.admin.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))])
+
+async def prime_caches():
+    """Load the hot read paths so the first visitors hit warm caches"""
+    await get_catalog()
+    mission_cache.set("status", get_mission_status())
+    await transmissions_cache.get_or_load("all", load_transmissions)
+    await transmissions_cache.get_or_load("latest", load_latest_transmission)
+    await get_moderation()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared resources, warm them up, and only then report ready"""
+    global storage
+    started = time.perf_counter()
+    timings = {}
+    
+    async def timed(name: str, step):
+        step_started = time.perf_counter()
+        await step
+        timings[name] = round((time.perf_counter() - step_started) * 1000, 1)
+    
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    storage = storage_from_env(local_root=UPLOAD_DIR)
+    await timed("mongo_pool", open_database())
+    job_runner.bind(db)
+    await timed("indexes", ensure_indexes())
+    await timed("caches", prime_caches())
+    await timed("scroll_ids", scroll_ids.load(db.guardians))
+    await timed("scroll_id_counter", seed_scroll_id_counter())
+    await timed("cache_bus", caches.bus.start(db))
+    await timed("job_runner", job_runner.start())
+    
+    app.state.startup_ms = round((time.perf_counter() - started) * 1000, 1)
+    app.state.ready = True
+    logger.info("Startup finished in %.1f ms %s", app.state.startup_ms, timings)
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        if comment_batcher:
+            await comment_batcher.close()
+        await job_runner.stop()
+        await caches.bus.stop()
+        client.close()
+
+def create_app() -> FastAPI:
+    """Build the application; resources are opened by its lifespan"""
+    app = FastAPI(lifespan=lifespan)
+    app.state.ready = False
+    
+    # Include the router in the main app
+    app.include_router(api_router)
+    
+    # Serve uploads from local disk, or send clients straight to the storage backend
+    if STORAGE_BACKEND == "local":
+        app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR), check_dir=False), name="uploads")
+    else:
+        @app.get("/uploads/{key:path}")
+        async def read_upload(key: str):
+            """Redirect upload reads to the storage backend"""
+            return RedirectResponse(await storage.read_url(key), status_code=307)
+    
+    app.add_middleware(LoaderScopeMiddleware)
+    app.add_middleware(
+        ProfilingMiddleware,
+        save=save_profile,
+        authorize=admin_authorized,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        interval=PROFILE_INTERVAL_MS / 1000
+    )
+    
+    # Added before CORS so shed requests still carry CORS headers
+    if ADMISSION_CONTROL_ENABLED:
+        app.add_middleware(AdmissionMiddleware, controller=admission)
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    logger.info("Imported server in %.1f ms", (time.perf_counter() - IMPORT_STARTED) * 1000)
+    return app
+
+app = create_app()
@@ -0,0 +1,238 @@
+"""Streaming database snapshots.
+
+A snapshot is gzip-compressed NDJSON in MongoDB Extended JSON (canonical
+mode, so ObjectIds, dates, UUIDs and numbers round-trip exactly). The first
+line is a header; every following line holds one document:
+
+    {"snapshot": {"version": 1, "created_at": ..., "collections": [...], "exclude_password_hashes": false}}
+    {"collection": "guardians", "document": {...}}
+
+Export and import both stream: documents are read in batches and
+compressed chunk by chunk, and imports decompress incrementally and write
+ordered batches, so memory stays flat however large the database is.
+
+On a replica set or sharded cluster every collection is read in one
+snapshot session, so the export reflects a single point in time even while
+writes continue. Snapshot reads are bounded by the server's
+minSnapshotHistoryWindowInSeconds (5 minutes by default); raise it for
+exports that take longer. A standalone mongod has no snapshot read concern,
+so there the collections are read one after another and concurrent writes
+can leave them mutually inconsistent; the header's "consistent" flag records
+which case applied.
+
+    python snapshot.py export --out snapshot.ndjson.gz [--exclude-password-hashes]
+    python snapshot.py import --in snapshot.ndjson.gz [--mode upsert|insert]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+from bson import json_util
+from bson.binary import UuidRepresentation
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_COLLECTIONS = ["guardians", "transmissions", "orders", "products", "comments"]
+IMPORT_MODES = ["upsert", "insert"]
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS.with_options(uuid_representation=UuidRepresentation.STANDARD)
+FLUSH_BYTES = 256 * 1024
+DECOMPRESS_BYTES = 1024 * 1024
+MAX_LINE_BYTES = 64 * 1024 * 1024  # Well above a 16MB document in Extended JSON
+
+
+async def start_snapshot_session(database):
+    """A session reading every query at one cluster time, or None on a standalone mongod"""
+    try:
+        hello = await database.client.admin.command("hello")
+    except OperationFailure:
+        return None
+    if "setName" not in hello and hello.get("msg") != "isdbgrid":
+        return None
+    return await database.client.start_session(snapshot=True)
+
+
+async def iter_snapshot(database, collections: Iterable[str] = SNAPSHOT_COLLECTIONS,
+                        exclude_password_hashes: bool = False, batch_size: int = 1000,
+                        on_progress: Optional[Callable[[dict], object]] = None) -> AsyncIterator[bytes]:
+    """Yield a gzip-compressed snapshot of collections"""
+    collections = list(collections)
+    compressor = zlib.compressobj(wbits=31)  # 31 selects the gzip container
+    buffer = bytearray()
+    counts = {name: 0 for name in collections}
+    session = await start_snapshot_session(database)
+
+    header = {"snapshot": {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "collections": collections,
+        "exclude_password_hashes": exclude_password_hashes,
+        "consistent": session is not None
+    }}
+    buffer += compressor.compress(json.dumps(header).encode("utf-8") + b"\n")
+
+    try:
+        for name in collections:
+            projection = {"password_hash": 0} if exclude_password_hashes and name == "guardians" else None
+            # _id order keeps the scan on the primary key and makes snapshots reproducible
+            cursor = database[name].find({}, projection, batch_size=batch_size, session=session).sort("_id", 1)
+            async for doc in cursor:
+                line = json_util.dumps({"collection": name, "document": doc}, json_options=JSON_OPTIONS)
+                buffer += compressor.compress(line.encode("utf-8") + b"\n")
+                counts[name] += 1
+                if len(buffer) >= FLUSH_BYTES:
+                    yield bytes(buffer)
+                    buffer.clear()
+                    if on_progress:
+                        result = on_progress(counts)
+                        if asyncio.iscoroutine(result):
+                            await result
+    finally:
+        if session is not None:
+            await session.end_session()
+
+    buffer += compressor.flush()
+    yield bytes(buffer)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Decompress a gzip stream and split it into lines
+
+    Output is produced DECOMPRESS_BYTES at a time, so a small, highly
+    compressible upload cannot expand into memory all at once.
+    """
+    decompressor = zlib.decompressobj(wbits=31)
+    pending = b""
+    async for chunk in chunks:
+        while chunk:
+            pending += decompressor.decompress(chunk, DECOMPRESS_BYTES)
+            chunk = decompressor.unconsumed_tail
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line:
+                    yield line
+            if len(pending) > MAX_LINE_BYTES:
+                raise ValueError("Snapshot line exceeds the maximum document size")
+    pending += decompressor.flush()
+    if pending.strip():
+        yield pending
+
+
+async def import_snapshot(database, chunks: AsyncIterator[bytes], mode: str = "upsert", batch_size: int = 500,
+                          collections: Optional[Iterable[str]] = None) -> dict:
+    """Write a snapshot's documents back in ordered batches; upsert replaces documents by _id"""
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown import mode: {mode}")
+    allowed = set(collections) if collections else set(SNAPSHOT_COLLECTIONS)
+    header = None
+    counts = {}
+    batch: List = []
+    batch_collection = None
+
+    async def flush():
+        if batch:
+            await database[batch_collection].bulk_write(batch, ordered=True)
+            counts[batch_collection] = counts.get(batch_collection, 0) + len(batch)
+            batch.clear()
+
+    async for line in iter_lines(chunks):
+        if header is None:
+            header = json.loads(line).get("snapshot")
+            if not header or header.get("version") != SNAPSHOT_VERSION:
+                raise ValueError("Not a snapshot file, or an unsupported snapshot version")
+            continue
+        record = json_util.loads(line, json_options=JSON_OPTIONS)
+        name, doc = record["collection"], record["document"]
+        if name not in allowed:
+            continue
+        if name != batch_collection or len(batch) >= batch_size:
+            await flush()
+            batch_collection = name
+
+        if mode == "insert":
+            batch.append(InsertOne(doc))
+        elif name == "guardians" and header.get("exclude_password_hashes"):
+            # Replacing would wipe the hashes of guardians that already exist
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": doc}, upsert=True))
+        else:
+            batch.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+    await flush()
+
+    if header is None:
+        raise ValueError("Empty snapshot")
+    return {"snapshot": header, "imported": counts}
+
+
+async def read_file(path: Path, chunk_size: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    f = await asyncio.to_thread(open, path, "rb")
+    try:
+        while chunk := await asyncio.to_thread(f.read, chunk_size):
+            yield chunk
+    finally:
+        f.close()
+
+
+async def write_file(path: Path, chunks: AsyncIterator[bytes]) -> int:
+    partial = path.with_name(path.name + ".partial")
+    size = 0
+    f = await asyncio.to_thread(open, partial, "wb")
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(f.write, chunk)
+            size += len(chunk)
+    except BaseException:
+        f.close()
+        await asyncio.to_thread(partial.unlink, True)
+        raise
+    f.close()
+    await asyncio.to_thread(os.replace, partial, path)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database snapshot tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write a compressed snapshot")
+    export_parser.add_argument("--out", type=Path, required=True)
+    export_parser.add_argument("--collections", nargs="+", choices=SNAPSHOT_COLLECTIONS, default=SNAPSHOT_COLLECTIONS)
+    export_parser.add_argument("--exclude-password-hashes", action="store_true")
+    import_parser = commands.add_parser("import", help="Load a compressed snapshot")
+    import_parser.add_argument("--in", dest="source", type=Path, required=True)
+    import_parser.add_argument("--collections", nargs="+", choices=SNAPSHOT_COLLECTIONS)
+    import_parser.add_argument("--mode", choices=IMPORT_MODES, default="upsert")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True, uuidRepresentation="standard")
+        database = client[os.environ["DB_NAME"]]
+        try:
+            if args.command == "export":
+                size = await write_file(args.out, iter_snapshot(
+                    database, args.collections, args.exclude_password_hashes,
+                    on_progress=lambda counts: logger.info("Exported %s", counts)
+                ))
+                logger.info("Snapshot written to %s (%d bytes)", args.out, size)
+            else:
+                result = await import_snapshot(database, read_file(args.source), args.mode, collections=args.collections)
+                logger.info("Snapshot imported: %s", result["imported"])
+        finally:
+            client.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""Upload storage backends.
+
+Uploaded files are addressed by key (e.g. "3f2a....png") and written through
+a StorageBackend. LocalStorage keeps them under a directory on this pod's
+disk; S3Storage writes to any S3-compatible bucket (AWS, MinIO, R2, ...) and
+hands out presigned URLs so reads never pass through the API workers.
+
+Migrate existing files between backends with:
+
+    python storage.py migrate --source local --dest s3
+"""
+import abc
+import argparse
+import asyncio
+import logging
+import mimetypes
+import os
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+S3_PART_SIZE = 8 * 1024 * 1024  # S3 requires every part but the last to be at least 5MB
+
+
+class StorageBackend(abc.ABC):
+    """Interface shared by the storage backends"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def save_stream(self, key: str, chunks: AsyncIterator[bytes], content_type: Optional[str] = None) -> int:
+        """Write a stream of chunks under key, returning the number of bytes written"""
+
+    @abc.abstractmethod
+    def read_stream(self, key: str) -> AsyncIterator[bytes]:
+        """Yield the stored bytes of key in chunks"""
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Whether key is stored"""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        """Remove key; deleting a missing key is not an error"""
+
+    @abc.abstractmethod
+    def list_keys(self, prefix: str = "") -> AsyncIterator[str]:
+        """Yield every stored key starting with prefix"""
+
+    async def read_url(self, key: str) -> Optional[str]:
+        """URL clients can fetch the file from directly, None if it must be served by the API"""
+        return None
+
+    async def upload_url(self, key: str, content_type: str) -> Optional[dict]:
+        """Presigned direct-upload target, None if the backend only accepts uploads through the API"""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Files on the local disk, served by the app's /uploads static mount"""
+
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    async def save_stream(self, key, chunks, content_type=None):
+        path = self.path(key)
+        partial = path.with_name(path.name + ".partial")
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        size = 0
+        f = await asyncio.to_thread(open, partial, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+                size += len(chunk)
+        except BaseException:
+            f.close()
+            await asyncio.to_thread(partial.unlink, True)
+            raise
+        f.close()
+        await asyncio.to_thread(os.replace, partial, path)
+        return size
+
+    async def read_stream(self, key):
+        f = await asyncio.to_thread(open, self.path(key), "rb")
+        try:
+            while chunk := await asyncio.to_thread(f.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            f.close()
+
+    async def exists(self, key):
+        return await asyncio.to_thread(self.path(key).is_file)
+
+    async def delete(self, key):
+        await asyncio.to_thread(self.path(key).unlink, True)
+
+    async def list_keys(self, prefix=""):
+        paths = await asyncio.to_thread(lambda: sorted(self.root.rglob("*")))
+        for path in paths:
+            key = path.relative_to(self.root).as_posix()
+            if path.is_file() and key.startswith(prefix) and not key.endswith(".partial"):
+                yield key
+
+
+class S3Storage(StorageBackend):
+    """Objects in an S3-compatible bucket, read through presigned or public URLs"""
+
+    name = "s3"
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 public_url: Optional[str] = None, presign_seconds: int = 3600, prefix: str = ""):
+        import boto3
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.presign_seconds = presign_seconds
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    async def save_stream(self, key, chunks, content_type=None):
+        object_key = self.object_key(key)
+        content_type = content_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+
+        async def upload_part(data: bytes):
+            response = await asyncio.to_thread(
+                self.client.upload_part,
+                Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                PartNumber=len(parts) + 1, Body=data
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": len(parts) + 1})
+
+        try:
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                size += len(chunk)
+                if len(buffer) >= S3_PART_SIZE:
+                    # Only switch to a multipart upload once the file outgrows a single part
+                    if upload_id is None:
+                        response = await asyncio.to_thread(
+                            self.client.create_multipart_upload,
+                            Bucket=self.bucket, Key=object_key, ContentType=content_type
+                        )
+                        upload_id = response["UploadId"]
+                    await upload_part(bytes(buffer))
+                    buffer.clear()
+
+            if upload_id is None:
+                await asyncio.to_thread(
+                    self.client.put_object,
+                    Bucket=self.bucket, Key=object_key, Body=bytes(buffer), ContentType=content_type
+                )
+            else:
+                if buffer:
+                    await upload_part(bytes(buffer))
+                await asyncio.to_thread(
+                    self.client.complete_multipart_upload,
+                    Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts}
+                )
+        except BaseException:
+            if upload_id is not None:
+                await asyncio.to_thread(
+                    self.client.abort_multipart_upload,
+                    Bucket=self.bucket, Key=object_key, UploadId=upload_id
+                )
+            raise
+        return size
+
+    async def read_stream(self, key):
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self.object_key(key))
+        body = response["Body"]
+        try:
+            while chunk := await asyncio.to_thread(body.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def delete(self, key):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key))
+
+    async def list_keys(self, prefix=""):
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = await asyncio.to_thread(
+            lambda: list(paginator.paginate(Bucket=self.bucket, Prefix=self.object_key(prefix)))
+        )
+        for page in pages:
+            for obj in page.get("Contents", []):
+                yield obj["Key"][len(self.prefix):]
+
+    async def read_url(self, key):
+        if self.public_url:
+            return f"{self.public_url}/{self.object_key(key)}"
+        return await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self.object_key(key)},
+            ExpiresIn=self.presign_seconds
+        )
+
+    async def upload_url(self, key, content_type):
+        url = await asyncio.to_thread(
+            self.client.generate_presigned_url,
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": self.object_key(key), "ContentType": content_type},
+            ExpiresIn=self.presign_seconds
+        )
+        return {"method": "PUT", "url": url, "headers": {"Content-Type": content_type}}
+
+
+def storage_from_env(backend: Optional[str] = None, local_root: Optional[Path] = None) -> StorageBackend:
+    """Build the storage backend selected by STORAGE_BACKEND (local or s3)"""
+    backend = backend or os.environ.get("STORAGE_BACKEND", "local")
+    if backend == "local":
+        return LocalStorage(local_root or Path(os.environ.get("UPLOAD_DIR", Path(__file__).parent / "uploads")))
+    if backend == "s3":
+        return S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL"),
+            region=os.environ.get("S3_REGION"),
+            public_url=os.environ.get("S3_PUBLIC_URL"),
+            presign_seconds=int(os.environ.get("S3_PRESIGN_SECONDS", 3600)),
+            prefix=os.environ.get("S3_PREFIX", "")
+        )
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+async def migrate(source: StorageBackend, dest: StorageBackend, prefix: str = "", overwrite: bool = False,
+                  on_progress: Optional[Callable[[dict], object]] = None) -> dict:
+    """Copy every file under prefix from source to dest, streaming each one"""
+    stats = {"copied": 0, "skipped": 0, "failed": 0, "bytes": 0}
+    async for key in source.list_keys(prefix):
+        try:
+            if not overwrite and await dest.exists(key):
+                stats["skipped"] += 1
+            else:
+                stats["bytes"] += await dest.save_stream(key, source.read_stream(key), mimetypes.guess_type(key)[0])
+                stats["copied"] += 1
+        except Exception:
+            logger.exception("Failed to migrate %s", key)
+            stats["failed"] += 1
+        if on_progress:
+            result = on_progress(stats)
+            if asyncio.iscoroutine(result):
+                await result
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload storage tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser("migrate", help="Copy uploads from one backend to another")
+    migrate_parser.add_argument("--source", choices=["local", "s3"], default="local")
+    migrate_parser.add_argument("--dest", choices=["local", "s3"], default="s3")
+    migrate_parser.add_argument("--prefix", default="")
+    migrate_parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).parent / ".env")
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    stats = asyncio.run(migrate(
+        storage_from_env(args.source),
+        storage_from_env(args.dest),
+        prefix=args.prefix,
+        overwrite=args.overwrite
+    ))
+    logger.info("Migration finished: %s", stats)
+
+
+if __name__ == "__main__":
+    main()
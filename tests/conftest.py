@@ -0,0 +1,11 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend modules import each other as top-level modules, the way uvicorn runs them from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server.py reads these at import time; nothing connects until the app starts
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+os.environ.setdefault("CACHE_INVALIDATION", "local")
@@ -0,0 +1,154 @@
+import copy
+import types
+import uuid
+
+
+def same(value, expected) -> bool:
+    # Binary and string UUIDs are different BSON values; keep them apart the way MongoDB does
+    if isinstance(value, uuid.UUID) != isinstance(expected, uuid.UUID):
+        return False
+    return value == expected
+
+
+def get_path(doc: dict, path: str):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+
+def set_path(doc: dict, path: str, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def unset_path(doc: dict, path: str):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part, {})
+    doc.pop(last, None)
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, expected in query.items():
+        if field == "$and":
+            if not all(matches(doc, part) for part in expected):
+                return False
+            continue
+        value = get_path(doc, field)
+        if not isinstance(expected, dict):
+            if not same(value, expected):
+                return False
+            continue
+        for op, operand in expected.items():
+            if op == "$in":
+                ok = any(same(value, candidate) for candidate in operand)
+            elif op == "$ne":
+                ok = not same(value, operand)
+            elif op == "$gte":
+                ok = value is not None and value >= operand
+            elif op == "$lt":
+                ok = value is not None and value < operand
+            else:
+                raise NotImplementedError(op)
+            if not ok:
+                return False
+    return True
+
+
+def apply_update(doc: dict, update: dict):
+    for path, value in update.get("$set", {}).items():
+        set_path(doc, path, copy.deepcopy(value))
+    for path, amount in update.get("$inc", {}).items():
+        set_path(doc, path, (get_path(doc, path) or 0) + amount)
+    for path, value in update.get("$push", {}).items():
+        current = get_path(doc, path)
+        set_path(doc, path, [*(current or []), copy.deepcopy(value)])
+    for path in update.get("$unset", {}):
+        unset_path(doc, path)
+
+
+def project(doc: dict, projection) -> dict:
+    doc = copy.deepcopy(doc)
+    if not projection:
+        return doc
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        return {field: doc[field] for field in included if field in doc}
+    return {field: value for field, value in doc.items() if projection.get(field, 1)}
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+
+class FakeCollection:
+    """The collection operations the order and comment routes use, kept in memory"""
+
+    def __init__(self, *docs):
+        self.docs = [copy.deepcopy(doc) for doc in docs]
+        self.calls = []
+
+    def matching(self, query):
+        return [doc for doc in self.docs if matches(doc, query)]
+
+    async def insert_one(self, doc):
+        self.calls.append("insert_one")
+        self.docs.append(copy.deepcopy(doc))
+
+    def find(self, query, projection=None):
+        self.calls.append("find")
+        return FakeCursor([project(doc, projection) for doc in self.matching(query)])
+
+    async def find_one(self, query, projection=None):
+        self.calls.append("find_one")
+        found = self.matching(query)
+        return project(found[0], projection) if found else None
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=False):
+        self.calls.append("find_one_and_update")
+        found = self.matching(query)
+        if not found:
+            return None
+        before = project(found[0], projection)
+        apply_update(found[0], update)
+        return project(found[0], projection) if return_document else before
+
+    async def find_one_and_delete(self, query, projection=None):
+        self.calls.append("find_one_and_delete")
+        found = self.matching(query)
+        if not found:
+            return None
+        self.docs.remove(found[0])
+        return project(found[0], projection)
+
+    def update(self, query, update, many):
+        found = self.matching(query)[:None if many else 1]
+        for doc in found:
+            apply_update(doc, update)
+        return types.SimpleNamespace(matched_count=len(found), modified_count=len(found))
+
+    async def update_one(self, query, update):
+        self.calls.append("update_one")
+        return self.update(query, update, many=False)
+
+    async def update_many(self, query, update):
+        self.calls.append("update_many")
+        return self.update(query, update, many=True)
+
+    async def delete_many(self, query):
+        self.calls.append("delete_many")
+        found = self.matching(query)
+        self.docs = [doc for doc in self.docs if doc not in found]
+
+    async def bulk_write(self, requests, ordered=True):
+        self.calls.append("bulk_write")
+        for request in requests:
+            self.update(request._filter, request._doc, many=False)
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, Rejected, RouteClassLimiter, classify
+
+
+def test_classify_route_classes():
+    assert classify("GET", "/api/transmissions", {}) == "public_read"
+    assert classify("POST", "/api/comments", {}) == "write"
+    assert classify("POST", "/api/guardians/login", {}) == "auth"
+    assert classify("GET", "/api/health/ready", {}) is None
+    assert classify("GET", "/uploads/a.png", {}) is None
+
+
+def test_only_verified_credentials_get_an_admin_slot():
+    headers = {"authorization": "Basic Zm9vOmJhcg=="}
+
+    assert classify("GET", "/api/admin/jobs", headers) == "public_read"
+    assert classify("POST", "/api/orders", headers) == "write"
+    assert classify("GET", "/api/admin/jobs", headers, authorize=lambda h: True) == "admin"
+    assert classify("POST", "/api/orders", headers, authorize=lambda h: True) == "admin"
+    assert classify("POST", "/api/orders", {}, authorize=lambda h: True) == "write"
+
+
+def test_controller_classifies_with_its_authorizer():
+    controller = AdmissionController(authorize=lambda headers: headers.get("authorization") == "ok")
+
+    assert controller.classify("GET", "/api/admin/stats", {"authorization": "ok"}) == "admin"
+    assert controller.classify("GET", "/api/admin/stats", {"authorization": "nope"}) == "public_read"
+
+
+async def started(coro) -> asyncio.Task:
+    """Start coro and let it run until it blocks"""
+    task = asyncio.ensure_future(coro)
+    await asyncio.sleep(0)
+    return task
+
+
+def test_waiters_are_admitted_in_fifo_order():
+    async def scenario():
+        limiter = RouteClassLimiter("write", concurrency=1, queue_size=5, queue_timeout=5)
+        await limiter.acquire()
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire()
+            order.append(name)
+
+        tasks = [await started(waiter(name)) for name in "abc"]
+        assert len(limiter.waiters) == 3 and order == []
+
+        for _ in tasks:
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c"]
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+        assert limiter.stats()["admitted"] == 4
+
+    asyncio.run(scenario())
+
+
+def test_new_requests_do_not_jump_the_queue():
+    async def scenario():
+        limiter = RouteClassLimiter("write", concurrency=1, queue_size=5, queue_timeout=5)
+        await limiter.acquire()
+        first = await started(limiter.acquire())
+        limiter.release()
+        # The freed slot already belongs to the queued request
+        second = await started(limiter.acquire())
+        assert not second.done()
+        await first
+        limiter.release()
+        await second
+        assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_rejects_immediately():
+    async def scenario():
+        limiter = RouteClassLimiter("auth", concurrency=1, queue_size=1, queue_timeout=5)
+        await limiter.acquire()
+        queued = await started(limiter.acquire())
+
+        with pytest.raises(Rejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_full"
+        assert limiter.rejected_queue_full == 1
+
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_rejects_and_leaves_the_queue():
+    async def scenario():
+        limiter = RouteClassLimiter("auth", concurrency=1, queue_size=5, queue_timeout=0.01)
+        await limiter.acquire()
+
+        with pytest.raises(Rejected) as rejected:
+            await limiter.acquire()
+        assert rejected.value.reason == "queue_timeout"
+        assert limiter.rejected_timeout == 1
+        assert not limiter.waiters
+        # The timed-out waiter must not swallow the next released slot
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = RouteClassLimiter("write", concurrency=1, queue_size=5, queue_timeout=5)
+        await limiter.acquire()
+        cancelled = await started(limiter.acquire())
+        behind = await started(limiter.acquire())
+
+        cancelled.cancel()
+        await asyncio.gather(cancelled, return_exceptions=True)
+        assert len(limiter.waiters) == 1
+
+        limiter.release()
+        await behind
+        assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def scenario():
+        limiter = RouteClassLimiter("write", concurrency=1, queue_size=5, queue_timeout=5)
+        await limiter.acquire()
+        cancelled = await started(limiter.acquire())
+        behind = await started(limiter.acquire())
+
+        # The slot is handed over, then the client disconnects before the waiter resumes
+        limiter.release()
+        cancelled.cancel()
+        outcome = (await asyncio.gather(cancelled, return_exceptions=True))[0]
+        if not isinstance(outcome, asyncio.CancelledError):
+            # Before Python 3.12 wait_for can let the result win over the cancellation;
+            # the caller then holds the slot and releases it like any finished request
+            limiter.release()
+
+        await asyncio.wait_for(behind, 1)
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_scales_with_backlog():
+    limiter = RouteClassLimiter("write", concurrency=2, queue_size=5, queue_timeout=5)
+    limiter.active = 2
+    limiter.release(held_ms=1000)
+    limiter.active = 2
+    limiter.waiters.extend([object()] * 4)
+
+    assert limiter.retry_after() == 3
@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+
+from cache import MISSING, CacheRegistry, LocalInvalidationBus, TTLCache
+
+
+def test_entries_expire_after_their_ttl():
+    cache = TTLCache("test", ttl=60)
+    cache.set("fresh", 1)
+    cache.set("stale", 2, ttl=-1)
+
+    assert cache.get("fresh") == 1
+    assert cache.get("stale") is MISSING
+    assert "stale" not in cache.entries
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = TTLCache("test")
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert calls == 1
+        assert cache.get("k") == "value"
+        assert cache.loading == {}
+
+    asyncio.run(scenario())
+
+
+def test_load_that_raced_an_invalidation_is_not_cached():
+    async def scenario():
+        cache = TTLCache("test")
+        data = {"k": "old"}
+        read = asyncio.Event()
+        resume = asyncio.Event()
+
+        async def slow_loader():
+            value = data["k"]
+            read.set()
+            await resume.wait()
+            return value
+
+        async def fresh_loader():
+            return data["k"]
+
+        first = asyncio.ensure_future(cache.get_or_load("k", slow_loader))
+        await read.wait()
+        # A write lands and invalidates while the old value is still in flight
+        data["k"] = "new"
+        cache.delete("k")
+        # Later readers must not join the stale load
+        assert await cache.get_or_load("k", fresh_loader) == "new"
+        resume.set()
+
+        assert await first == "old"
+        assert cache.get("k") == "new"
+
+    asyncio.run(scenario())
+
+
+def test_clear_during_a_load_discards_its_result():
+    async def scenario():
+        cache = TTLCache("test")
+
+        async def loader():
+            cache.clear()
+            return "value"
+
+        assert await cache.get_or_load("k", loader) == "value"
+        assert cache.get("k") is MISSING
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_load():
+    async def scenario():
+        cache = TTLCache("test")
+        resume = asyncio.Event()
+
+        async def loader():
+            await resume.wait()
+            return "value"
+
+        cancelled = asyncio.ensure_future(cache.get_or_load("k", loader))
+        waiting = asyncio.ensure_future(cache.get_or_load("k", loader))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        resume.set()
+
+        assert await waiting == "value"
+        assert cancelled.cancelled()
+        assert cache.get("k") == "value"
+
+    asyncio.run(scenario())
+
+
+def test_failed_load_is_not_cached_and_can_be_retried():
+    async def scenario():
+        cache = TTLCache("test")
+
+        async def failing():
+            raise RuntimeError("down")
+
+        async def working():
+            return "value"
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("k", failing)
+        assert cache.loading == {}
+        assert await cache.get_or_load("k", working) == "value"
+
+    asyncio.run(scenario())
+
+
+def test_invalidation_reaches_every_registry_on_the_bus():
+    async def scenario():
+        bus = LocalInvalidationBus()
+        workers = [CacheRegistry(bus), CacheRegistry(bus)]
+        for registry in workers:
+            registry.cache("guardians").set("SB-0001", {"scroll_id": "SB-0001"})
+            registry.cache("guardians").set("SB-0002", {"scroll_id": "SB-0002"})
+
+        await workers[0].invalidate("guardians", "SB-0001")
+
+        for registry in workers:
+            assert registry.caches["guardians"].get("SB-0001") is MISSING
+            assert registry.caches["guardians"].get("SB-0002") is not MISSING
+
+    asyncio.run(scenario())
+
+
+def test_dependent_caches_are_cleared_with_their_source():
+    async def scenario():
+        registry = CacheRegistry()
+        catalog = registry.cache("catalog")
+        responses = registry.cache("responses.catalog", invalidated_by=["catalog"])
+        other = registry.cache("other")
+        for cache in (catalog, responses, other):
+            cache.set("k", 1)
+
+        await registry.invalidate("catalog")
+
+        assert catalog.get("k") is MISSING and responses.get("k") is MISSING
+        assert other.get("k") == 1
+
+        await registry.invalidate(None)
+        assert other.get("k") is MISSING
+
+    asyncio.run(scenario())
+
+
+def test_failed_broadcast_still_invalidates_locally():
+    class BrokenBus(LocalInvalidationBus):
+        async def publish(self, message):
+            raise ConnectionError("bus down")
+
+    async def scenario():
+        registry = CacheRegistry(BrokenBus())
+        cache = registry.cache("guardians")
+        cache.set("k", 1)
+
+        await registry.invalidate("guardians", "k")
+        assert cache.get("k") is MISSING
+
+    asyncio.run(scenario())
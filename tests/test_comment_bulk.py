@@ -0,0 +1,95 @@
+import asyncio
+import types
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import CommentBulkAction, CommentFilter
+from tests.fakes import FakeCollection
+
+TRANSMISSION = uuid.uuid4()
+
+
+def comment(scroll_id: str, day: int, is_deleted=False, moderation_status="approved", **fields) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "transmission_id": TRANSMISSION,
+        "scroll_id": scroll_id,
+        "created_at": datetime(2024, 5, day, tzinfo=timezone.utc),
+        "is_deleted": is_deleted,
+        "moderation_status": moderation_status,
+        **fields,
+    }
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = types.SimpleNamespace(comments=FakeCollection())
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def deleted_flags(db) -> list:
+    return [doc["is_deleted"] for doc in db.comments.docs]
+
+
+@pytest.mark.parametrize("action", [
+    CommentBulkAction(),
+    CommentBulkAction(comment_ids=[uuid.uuid4()], filter=CommentFilter(scroll_id="SB-0001")),
+    # deleted alone would select every comment in the collection
+    CommentBulkAction(filter=CommentFilter(deleted=True)),
+])
+def test_bulk_query_needs_exactly_one_narrowing_selector(action):
+    with pytest.raises(HTTPException) as raised:
+        server.comment_bulk_query(action)
+
+    assert raised.value.status_code == 400
+
+
+def test_bulk_query_by_ids_matches_binary_and_string_ids():
+    comment_id = uuid.uuid4()
+
+    assert server.comment_bulk_query(CommentBulkAction(comment_ids=[comment_id])) == \
+        {"id": {"$in": [comment_id, str(comment_id)]}}
+
+
+def test_bulk_query_by_filter_ignores_the_deleted_flag():
+    action = CommentBulkAction(filter=CommentFilter(scroll_id="sb-0001", deleted=False))
+
+    assert server.comment_bulk_query(action) == {"scroll_id": "SB-0001"}
+
+
+def test_bulk_delete_by_filter_soft_deletes_live_comments(db):
+    db.comments.docs.extend([
+        comment("SB-0001", 1), comment("SB-0001", 2, is_deleted=True), comment("SB-0002", 3),
+    ])
+    action = CommentBulkAction(filter=CommentFilter(scroll_id="SB-0001"))
+
+    assert asyncio.run(server.bulk_delete_comments(action, admin=True)) == {"matched": 1, "deleted": 1}
+    assert deleted_flags(db) == [True, True, False]
+    assert "deleted_at" in db.comments.docs[0]
+
+
+def test_bulk_delete_by_filter_respects_the_time_window(db):
+    db.comments.docs.extend([comment("SB-0001", day) for day in (1, 2, 3)])
+    action = CommentBulkAction(filter=CommentFilter(
+        since=datetime(2024, 5, 2, tzinfo=timezone.utc), until=datetime(2024, 5, 3, tzinfo=timezone.utc)
+    ))
+
+    asyncio.run(server.bulk_delete_comments(action, admin=True))
+
+    assert deleted_flags(db) == [False, True, False]
+
+
+def test_bulk_restore_leaves_rejected_comments_deleted(db):
+    hand_deleted = comment("SB-0001", 1, is_deleted=True, deleted_at=datetime(2024, 5, 4, tzinfo=timezone.utc))
+    rejected = comment("SB-0001", 2, is_deleted=True, moderation_status="rejected")
+    db.comments.docs.extend([hand_deleted, rejected])
+    action = CommentBulkAction(comment_ids=[hand_deleted["id"], rejected["id"]])
+
+    assert asyncio.run(server.bulk_restore_comments(action, admin=True)) == {"matched": 1, "restored": 1}
+    assert deleted_flags(db) == [False, True]
+    assert "deleted_at" not in db.comments.docs[0]
@@ -0,0 +1,184 @@
+import asyncio
+import types
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+import server
+
+
+class FakeIdempotencyKeys:
+    """The handful of collection operations run_idempotent uses, kept in memory"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def matches(self, doc: dict, query: dict) -> bool:
+        for field, expected in query.items():
+            value = doc.get(field)
+            if isinstance(expected, dict) and "$lt" in expected:
+                if not value < expected["$lt"]:
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+    async def insert_one(self, doc):
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate key", 11000)
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc and self.matches(doc, query) else None
+
+    async def find_one_and_update(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if not doc or not self.matches(doc, query):
+            return None
+        before = dict(doc)
+        doc.update(update["$set"])
+        return before
+
+    async def update_one(self, query, update):
+        doc = self.docs.get(query["_id"])
+        if doc and self.matches(doc, query):
+            doc.update(update["$set"])
+
+    async def delete_one(self, query):
+        doc = self.docs.get(query["_id"])
+        if doc and self.matches(doc, query):
+            del self.docs[query["_id"]]
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    collection = FakeIdempotencyKeys()
+    monkeypatch.setattr(server, "db", types.SimpleNamespace(idempotency_keys=collection))
+    monkeypatch.setattr(server, "IDEMPOTENCY_WAIT_SECONDS", 1)
+    return collection
+
+
+def counting_handler(result=None, error=None):
+    async def handler():
+        handler.calls += 1
+        if error:
+            raise error
+        return result if result is not None else {"id": handler.calls}
+    handler.calls = 0
+    return handler
+
+
+def test_without_a_key_every_request_runs(keys):
+    handler = counting_handler()
+
+    asyncio.run(server.run_idempotent("orders", None, {}, handler))
+    asyncio.run(server.run_idempotent("orders", None, {}, handler))
+
+    assert handler.calls == 2
+    assert keys.docs == {}
+
+
+def test_retry_replays_the_stored_response(keys):
+    handler = counting_handler()
+
+    first = asyncio.run(server.run_idempotent("orders", "k1", {"total": 1}, handler))
+    replay = asyncio.run(server.run_idempotent("orders", "k1", {"total": 1}, handler))
+
+    assert first == {"id": 1}
+    assert handler.calls == 1
+    assert replay.status_code == 200
+    assert replay.body == b'{"id":1}'
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert keys.docs["orders:k1"]["status"] == "completed"
+
+
+def test_keys_are_scoped(keys):
+    handler = counting_handler()
+
+    asyncio.run(server.run_idempotent("orders", "k1", {}, handler))
+    asyncio.run(server.run_idempotent("comments", "k1", {}, handler))
+
+    assert handler.calls == 2
+
+
+def test_reusing_a_key_for_a_different_request_is_rejected(keys):
+    asyncio.run(server.run_idempotent("orders", "k1", {"total": 1}, counting_handler()))
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.run_idempotent("orders", "k1", {"total": 2}, counting_handler()))
+    assert raised.value.status_code == 422
+
+
+def test_overlong_key_is_rejected(keys):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.run_idempotent("orders", "k" * 256, {}, counting_handler()))
+    assert raised.value.status_code == 400
+
+
+def test_client_errors_are_stored_and_replayed(keys):
+    handler = counting_handler(error=HTTPException(status_code=409, detail="Out of stock"))
+
+    with pytest.raises(HTTPException):
+        asyncio.run(server.run_idempotent("orders", "k1", {}, handler))
+    replay = asyncio.run(server.run_idempotent("orders", "k1", {}, handler))
+
+    assert handler.calls == 1
+    assert replay.status_code == 409
+    assert replay.body == b'{"detail":"Out of stock"}'
+
+
+@pytest.mark.parametrize("error", [RuntimeError("database down"), HTTPException(status_code=503, detail="busy")])
+def test_server_errors_release_the_key_for_a_retry(keys, error):
+    with pytest.raises(type(error)):
+        asyncio.run(server.run_idempotent("orders", "k1", {}, counting_handler(error=error)))
+    assert keys.docs == {}
+
+    retry = counting_handler()
+    assert asyncio.run(server.run_idempotent("orders", "k1", {}, retry)) == {"id": 1}
+    assert retry.calls == 1
+
+
+def test_concurrent_duplicate_waits_and_replays(keys):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler():
+            handler.calls += 1
+            await release.wait()
+            return {"id": "order"}
+        handler.calls = 0
+
+        first = asyncio.ensure_future(server.run_idempotent("orders", "k1", {}, handler))
+        await asyncio.sleep(0)
+        duplicate = asyncio.ensure_future(server.run_idempotent("orders", "k1", {}, handler))
+        await asyncio.sleep(0.01)
+        assert not duplicate.done()
+
+        release.set()
+        assert await first == {"id": "order"}
+        replay = await duplicate
+        assert replay.headers["Idempotent-Replayed"] == "true"
+        assert handler.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_in_flight_key_is_taken_over(keys):
+    stale = datetime.now(timezone.utc) - timedelta(seconds=server.IDEMPOTENCY_LOCK_SECONDS + 1)
+    fingerprint = "0" * 64
+    keys.docs["orders:k1"] = {"_id": "orders:k1", "fingerprint": fingerprint, "status": "in_flight", "created_at": stale}
+
+    assert asyncio.run(server.claim_idempotency_key("orders:k1", fingerprint)) is None
+    assert keys.docs["orders:k1"]["created_at"] > stale
+
+
+def test_live_in_flight_key_is_not_taken_over(keys):
+    fingerprint = "0" * 64
+    record = {"_id": "orders:k1", "fingerprint": fingerprint, "status": "in_flight",
+              "created_at": datetime.now(timezone.utc)}
+    keys.docs["orders:k1"] = dict(record)
+
+    assert asyncio.run(server.claim_idempotency_key("orders:k1", fingerprint)) == record
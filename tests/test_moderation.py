@@ -0,0 +1,76 @@
+from moderation import Automaton, Match, Term
+
+
+def automaton(*terms) -> Automaton:
+    return Automaton(Term(term, action, whole_word) for term, action, whole_word in terms)
+
+
+def test_finds_every_overlapping_term_in_one_pass():
+    matcher = automaton(("he", "flag", False), ("she", "flag", False), ("his", "flag", False), ("hers", "flag", False))
+
+    matches = matcher.find("ushers")
+
+    assert sorted(matches) == sorted([
+        Match("she", "flag", 1, 4),
+        Match("he", "flag", 2, 4),
+        Match("hers", "flag", 2, 6),
+    ])
+
+
+def test_fail_links_recover_from_partial_matches():
+    matcher = automaton(("abcd", "flag", False), ("bce", "flag", False))
+
+    assert matcher.find("abce") == [Match("bce", "flag", 1, 4)]
+
+
+def test_matching_is_case_insensitive_and_folds_substitutions():
+    matcher = automaton(("Spam", "flag", False))
+
+    assert [m.term for m in matcher.find("SP4M and $pam")] == ["spam", "spam"]
+
+
+def test_folding_keeps_match_positions():
+    matcher = automaton(("hello", "flag", False))
+
+    assert matcher.find("say h3ll0!") == [Match("hello", "flag", 4, 9)]
+
+
+def test_whole_word_terms_need_word_boundaries():
+    matcher = automaton(("ass", "hold", True))
+
+    assert matcher.find("classic assignment") == []
+    assert [m.start for m in matcher.find("ass")] == [0]
+    assert [m.start for m in matcher.find("you ass.")] == [4]
+    assert [m.start for m in matcher.find("(ass)")] == [1]
+
+
+def test_substring_terms_match_inside_words():
+    matcher = automaton(("ass", "flag", False))
+
+    assert [m.start for m in matcher.find("classic")] == [2]
+
+
+def test_whole_word_and_substring_terms_share_a_prefix():
+    matcher = automaton(("scam", "flag", True), ("scammer", "hold", False))
+
+    assert [m.term for m in matcher.find("scammers")] == ["scammer"]
+    assert [m.term for m in matcher.find("a scam")] == ["scam"]
+
+
+def test_blank_terms_are_skipped():
+    matcher = automaton(("  ", "flag", False), ("", "hold", False), (" bad ", "flag", False))
+
+    assert len(matcher) == 1
+    assert [m.term for m in matcher.find("bad")] == ["bad"]
+
+
+def test_verdict_holds_when_any_hold_term_matches():
+    matcher = automaton(("meh", "flag", False), ("scam", "hold", True))
+
+    assert matcher.verdict("meh, a scam, meh") == ("held", ["meh", "scam"])
+    assert matcher.verdict("meh") == ("flagged", ["meh"])
+    assert matcher.verdict("all good") == (None, [])
+
+
+def test_empty_automaton_matches_nothing():
+    assert Automaton([]).verdict("anything") == (None, [])
@@ -0,0 +1,139 @@
+import asyncio
+import types
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import OrderStatusBulkUpdate
+from tests.fakes import FakeCollection
+
+
+def order(status: str, *items, stock_released=None) -> dict:
+    doc = {
+        "id": uuid.uuid4(),
+        "status": status,
+        "items": [{"product_type": product_type, "quantity": quantity, "stock_field": field}
+                  for product_type, field, quantity in items],
+        "status_history": [],
+        "created_at": datetime(2024, 5, 1, tzinfo=timezone.utc),
+    }
+    if stock_released is not None:
+        doc["stock_released"] = stock_released
+    return doc
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = types.SimpleNamespace(
+        orders=FakeCollection(),
+        products=FakeCollection(
+            {"product_type": "hoodie", "stock": 10, "size_stock": None},
+            {"product_type": "shirt", "stock": None, "size_stock": {"M": 10, "L": 10}},
+        ),
+        sales_daily=FakeCollection(),
+    )
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def stock(db) -> dict:
+    return {product["product_type"]: product["stock"] or product["size_stock"] for product in db.products.docs}
+
+
+def status_of(db, doc) -> str:
+    return next(o["status"] for o in db.orders.docs if o["id"] == doc["id"])
+
+
+def bulk(status: str, *docs) -> dict:
+    update = OrderStatusBulkUpdate(order_ids=[doc["id"] for doc in docs], status=status)
+    return asyncio.run(server.bulk_update_order_status(update, admin=True))
+
+
+def test_allowed_previous_statuses_follow_the_state_machine():
+    assert server.allowed_previous_statuses("cancelled") == ["pending", "processing"]
+    assert server.allowed_previous_statuses("delivered") == ["shipped"]
+    assert server.allowed_previous_statuses("pending") == []
+
+
+def test_single_transition_records_history(db):
+    pending = order("pending")
+    db.orders.docs.append(pending)
+
+    asyncio.run(server.update_order_status(pending["id"], "processing", admin=True))
+
+    stored = db.orders.docs[0]
+    assert stored["status"] == "processing"
+    assert [(h["from"], h["status"]) for h in stored["status_history"]] == [("pending", "processing")]
+
+
+def test_single_transition_outside_the_state_machine_is_rejected(db):
+    shipped = order("shipped")
+    db.orders.docs.append(shipped)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.update_order_status(shipped["id"], "pending", admin=True))
+
+    assert raised.value.status_code == 400
+    assert status_of(db, shipped) == "shipped"
+
+
+def test_single_cancel_releases_stock_once(db):
+    pending = order("pending", ("hoodie", "stock", 2), ("shirt", "size_stock.M", 3))
+    db.orders.docs.append(pending)
+
+    asyncio.run(server.update_order_status(pending["id"], "cancelled", admin=True))
+    asyncio.run(server.release_cancelled_order_stock([pending["id"]]))
+
+    assert stock(db) == {"hoodie": 12, "shirt": {"M": 13, "L": 10}}
+
+
+def test_bulk_reports_moved_rejected_and_missing_orders(db):
+    pending, processing, shipped = order("pending"), order("processing"), order("shipped")
+    db.orders.docs.extend([pending, processing, shipped])
+    missing = uuid.uuid4()
+
+    update = OrderStatusBulkUpdate(order_ids=[pending["id"], processing["id"], shipped["id"], missing], status="cancelled")
+    result = asyncio.run(server.bulk_update_order_status(update, admin=True))
+
+    assert result["updated"] == 2
+    assert result["transitions"] == {"pending->cancelled": 1, "processing->cancelled": 1}
+    assert result["rejected"] == [{"id": shipped["id"], "status": "shipped"}]
+    assert result["not_found"] == [missing]
+    assert status_of(db, shipped) == "shipped"
+
+
+def test_bulk_counts_orders_that_moved_concurrently_as_conflicts(db, monkeypatch):
+    first, second = order("pending"), order("pending")
+    db.orders.docs.extend([first, second])
+    update_many = db.orders.update_many
+
+    async def racing_update_many(query, update):
+        # Another admin moves the second order on between the read and the conditional update
+        db.orders.docs[1]["status"] = "processing"
+        return await update_many(query, update)
+
+    monkeypatch.setattr(db.orders, "update_many", racing_update_many)
+
+    result = bulk("cancelled", first, second)
+
+    assert result["updated"] == 1
+    assert result["conflicts"] == 1
+    assert status_of(db, second) == "processing"
+
+
+def test_bulk_cancel_releases_stock_only_for_moved_orders_and_only_once(db):
+    pending = order("pending", ("hoodie", "stock", 2), ("shirt", "size_stock.M", 1))
+    processing = order("processing", ("hoodie", "stock", 1), ("shirt", "size_stock.L", 4))
+    shipped = order("shipped", ("hoodie", "stock", 5))
+    released = order("cancelled", ("hoodie", "stock", 7), stock_released=True)
+    db.orders.docs.extend([pending, processing, shipped, released])
+
+    bulk("cancelled", pending, processing, shipped, released)
+    bulk("cancelled", pending, processing, shipped, released)
+
+    assert stock(db) == {"hoodie": 13, "shirt": {"M": 11, "L": 14}}
+    # Every product's counters come back in one bulk write, however many orders were cancelled
+    assert db.products.calls == ["bulk_write"]
@@ -0,0 +1,116 @@
+import asyncio
+import types
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+import server
+from server import OrderCreate, OrderItem
+from tests.fakes import FakeCollection
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = types.SimpleNamespace(
+        orders=FakeCollection(),
+        products=FakeCollection(
+            {"product_type": "hoodie", "name": "Hoodie", "price": 65.0, "is_active": True,
+             "stock": 3, "size_stock": None},
+            {"product_type": "shirt", "name": "Shirt", "price": 35.0, "is_active": True,
+             "stock": None, "size_stock": {"M": 2, "L": 5}},
+            {"product_type": "hat", "name": "Hat", "price": 30.0, "is_active": True,
+             "stock": None, "size_stock": None},
+        ),
+        sales_daily=FakeCollection(),
+    )
+
+    async def scroll_id_exists(scroll_id):
+        return scroll_id == "SB-0001"
+
+    async def get_catalog():
+        return {product["product_type"]: dict(product) for product in database.products.docs}
+
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "scroll_id_exists", scroll_id_exists)
+    monkeypatch.setattr(server, "get_catalog", get_catalog)
+    return database
+
+
+def stock(db) -> dict:
+    return {product["product_type"]: product["stock"] or product["size_stock"] for product in db.products.docs}
+
+
+def place(*items) -> server.Order:
+    order_data = OrderCreate(
+        scroll_id="sb-0001", email="guardian@example.com",
+        items=[OrderItem(product_type=product_type, size=size, quantity=quantity)
+               for product_type, size, quantity in items],
+        shipping_name="A", shipping_address="1 Main St", shipping_city="Town", shipping_state="ST", shipping_zip="12345"
+    )
+    return asyncio.run(server.place_order(order_data))
+
+
+def test_quantities_below_one_are_rejected_before_anything_is_reserved():
+    with pytest.raises(ValidationError):
+        OrderItem(product_type="hoodie", quantity=0)
+
+
+def test_order_reserves_tracked_counters(db):
+    order = place(("hoodie", None, 2), ("shirt", "M", 1), ("hat", None, 4))
+
+    assert stock(db) == {"hoodie": 1, "shirt": {"M": 1, "L": 5}, "hat": None}
+    assert order.total_amount == 2 * 65.0 + 35.0 + 4 * 30.0
+    assert [item["stock_field"] for item in db.orders.docs[0]["items"]] == ["stock", "size_stock.M", None]
+
+
+def test_out_of_stock_item_rolls_back_earlier_reservations(db):
+    with pytest.raises(HTTPException) as raised:
+        place(("hoodie", None, 2), ("shirt", "L", 1), ("shirt", "M", 3))
+
+    assert raised.value.status_code == 409
+    assert "Shirt (size M)" in raised.value.detail
+    assert stock(db) == {"hoodie": 3, "shirt": {"M": 2, "L": 5}, "hat": None}
+    assert db.orders.docs == []
+
+
+def test_unknown_size_is_rejected_before_anything_is_reserved(db):
+    with pytest.raises(HTTPException) as raised:
+        place(("hoodie", None, 1), ("shirt", "XS", 1))
+
+    assert raised.value.status_code == 400
+    assert stock(db) == {"hoodie": 3, "shirt": {"M": 2, "L": 5}, "hat": None}
+
+
+def test_failed_insert_releases_the_reservation(db, monkeypatch):
+    async def failing_insert(doc):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(db.orders, "insert_one", failing_insert)
+
+    with pytest.raises(RuntimeError):
+        place(("hoodie", None, 2))
+
+    assert stock(db)["hoodie"] == 3
+
+
+@pytest.mark.parametrize("status, stock_released, restored", [
+    ("pending", None, True),
+    ("processing", None, True),
+    ("shipped", None, False),
+    ("cancelled", True, False),
+    ("cancelled", None, True),
+])
+def test_deleting_an_order_returns_units_it_still_holds(db, status, stock_released, restored):
+    order = place(("hoodie", None, 2), ("shirt", "M", 1))
+    db.orders.docs[0]["status"] = status
+    if stock_released is not None:
+        db.orders.docs[0]["stock_released"] = stock_released
+
+    asyncio.run(server.delete_order(order.id, admin=True))
+
+    assert db.orders.docs == []
+    if restored:
+        assert stock(db) == {"hoodie": 3, "shirt": {"M": 2, "L": 5}, "hat": None}
+    else:
+        assert stock(db) == {"hoodie": 1, "shirt": {"M": 1, "L": 5}, "hat": None}
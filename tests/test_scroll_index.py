@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from scroll_index import Bitmap, BloomFilter, ScrollIdIndex
+
+
+def test_bitmap_is_exact_for_sequence_ids():
+    bitmap = Bitmap()
+    for number in (1, 7, 8, 1000):
+        bitmap.add(f"SB-{number:04d}")
+
+    assert all(f"SB-{number:04d}" in bitmap for number in (1, 7, 8, 1000))
+    assert not any(f"SB-{number:04d}" in bitmap for number in (0, 2, 9, 999, 1001, 50_000))
+    assert len(bitmap.bits) == 1000 // 8 + 1
+
+
+def test_bitmap_only_accepts_the_canonical_spelling():
+    bitmap = Bitmap()
+    bitmap.add("SB-0042")
+    bitmap.add("SB-12345")
+
+    assert "SB-0042" in bitmap and "SB-12345" in bitmap
+    assert "SB-42" not in bitmap
+    assert "SB-00042" not in bitmap
+
+
+def test_bitmap_keeps_other_ids_in_an_overflow_set():
+    bitmap = Bitmap()
+    bitmap.add("LEGACY-7")
+
+    assert "LEGACY-7" in bitmap
+    assert "LEGACY-8" not in bitmap
+    assert bitmap.bits == bytearray()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [f"SB-{number:04d}" for number in range(1000)]
+    for value in added:
+        bloom.add(value)
+
+    assert all(value in bloom for value in added)
+
+
+def test_bloom_filter_false_positive_rate_is_near_target():
+    bloom = BloomFilter(capacity=2000, error_rate=0.01)
+    for number in range(2000):
+        bloom.add(f"SB-{number:04d}")
+
+    false_positives = sum(f"SB-{number:04d}" in bloom for number in range(10_000, 30_000))
+    assert false_positives / 20_000 < 0.03
+
+
+@pytest.mark.parametrize("mode", ["set", "bitmap", "bloom"])
+def test_index_tracks_membership_and_counter_seed(mode):
+    index = ScrollIdIndex(mode, capacity=100, error_rate=0.001)
+    for scroll_id in ("SB-0003", "SB-0120", "LEGACY-1"):
+        index.add(scroll_id)
+
+    assert index.contains("SB-0120") and index.contains("LEGACY-1")
+    assert not index.contains("SB-0004")
+    assert index.max_sequence == 120
+    assert index.stats()["hits"] == 2 and index.stats()["misses"] == 1
+
+
+def test_index_loads_from_the_guardians_collection():
+    class Guardians:
+        def find(self, query, projection, batch_size):
+            async def cursor():
+                for scroll_id in ("SB-0001", None, "SB-0002"):
+                    yield {"scroll_id": scroll_id} if scroll_id else {}
+            return cursor()
+
+    index = ScrollIdIndex("bitmap")
+
+    assert asyncio.run(index.load(Guardians())) == 2
+    assert index.contains("SB-0002")
+    assert index.max_sequence == 2
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        ScrollIdIndex("trie")
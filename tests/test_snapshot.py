@@ -0,0 +1,41 @@
+import asyncio
+import zlib
+
+import pytest
+
+import snapshot
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    compressor = zlib.compressobj(wbits=31)
+    return compressor.compress(data) + compressor.flush()
+
+
+async def collect(data: bytes, chunk_size: int = 7) -> list:
+    async def chunks():
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+    return [line async for line in snapshot.iter_lines(chunks())]
+
+
+def test_lines_survive_arbitrary_chunk_boundaries():
+    data = gzip_bytes(b'{"a": 1}\n\n{"b": 2}\n{"c": 3}')
+
+    assert asyncio.run(collect(data)) == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+
+def test_decompression_is_bounded_per_step(monkeypatch):
+    monkeypatch.setattr(snapshot, "DECOMPRESS_BYTES", 64)
+    lines = [b"x" * 50 for _ in range(100)]
+
+    # The whole stream arrives as one chunk but is expanded 64 bytes at a time
+    assert asyncio.run(collect(gzip_bytes(b"\n".join(lines)), chunk_size=1 << 20)) == lines
+
+
+def test_oversized_line_is_rejected_before_it_is_buffered(monkeypatch):
+    monkeypatch.setattr(snapshot, "DECOMPRESS_BYTES", 1024)
+    monkeypatch.setattr(snapshot, "MAX_LINE_BYTES", 4096)
+    bomb = gzip_bytes(b"0" * (1 << 20))
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect(bomb, chunk_size=1 << 20))
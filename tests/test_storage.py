@@ -0,0 +1,219 @@
+import asyncio
+import io
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi import HTTPException, UploadFile
+
+import storage
+from storage import LocalStorage, S3Storage, StorageBackend
+
+
+class FakeS3Client:
+    """Records the boto3 S3 calls S3Storage makes and keeps objects in memory"""
+
+    def __init__(self, fail_on_part=None):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+        self.fail_on_part = fail_on_part
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self.calls.append("put_object")
+        self.objects[Key] = bytes(Body)
+        return {"ETag": '"put"'}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType):
+        self.calls.append("create_multipart_upload")
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.calls.append("upload_part")
+        if PartNumber == self.fail_on_part:
+            raise ClientError({"Error": {"Code": "InternalError"}}, "UploadPart")
+        self.uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append("complete_multipart_upload")
+        parts = self.uploads.pop(UploadId)
+        self.objects[Key] = b"".join(parts[part["PartNumber"]] for part in MultipartUpload["Parts"])
+        self.completed_parts = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append("abort_multipart_upload")
+        self.uploads.pop(UploadId)
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ContentLength": len(self.objects[Key])}
+
+    def get_object(self, Bucket, Key):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def get_paginator(self, operation):
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix):
+                keys = sorted(key for key in client.objects if key.startswith(Prefix))
+                yield {"Contents": [{"Key": key} for key in keys[:2]]}
+                yield {"Contents": [{"Key": key} for key in keys[2:]]}
+
+        return Paginator()
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"https://signed.example/{Params['Key']}?method={method}&expires={ExpiresIn}"
+
+
+def s3_storage(client, **kwargs) -> S3Storage:
+    backend = S3Storage("bucket", region="us-east-1", **kwargs)
+    backend.client = client
+    return backend
+
+
+async def chunks_of(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def read_all(backend: StorageBackend, key: str) -> bytes:
+    return b"".join([chunk async for chunk in backend.read_stream(key)])
+
+
+async def list_all(backend: StorageBackend, prefix: str = "") -> list:
+    return [key async for key in backend.list_keys(prefix)]
+
+
+def test_storage_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class Incomplete(StorageBackend):
+        async def exists(self, key):
+            return False
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_s3_small_file_is_one_put():
+    client = FakeS3Client()
+    backend = s3_storage(client, prefix="uploads/")
+
+    size = asyncio.run(backend.save_stream("a.png", chunks_of(b"ab", b"cd")))
+
+    assert size == 4
+    assert client.calls == ["put_object"]
+    assert client.objects == {"uploads/a.png": b"abcd"}
+    assert asyncio.run(read_all(backend, "a.png")) == b"abcd"
+
+
+def test_s3_large_file_uploads_numbered_parts(monkeypatch):
+    monkeypatch.setattr(storage, "S3_PART_SIZE", 4)
+    client = FakeS3Client()
+    backend = s3_storage(client)
+
+    size = asyncio.run(backend.save_stream("big.bin", chunks_of(b"abc", b"def", b"ghij", b"k")))
+
+    assert size == 11
+    assert client.calls[0] == "create_multipart_upload"
+    assert client.calls[-1] == "complete_multipart_upload"
+    assert [part["PartNumber"] for part in client.completed_parts] == [1, 2, 3]
+    assert client.objects["big.bin"] == b"abcdefghijk"
+
+
+def test_s3_failed_part_aborts_the_upload(monkeypatch):
+    monkeypatch.setattr(storage, "S3_PART_SIZE", 2)
+    client = FakeS3Client(fail_on_part=2)
+    backend = s3_storage(client)
+
+    with pytest.raises(ClientError):
+        asyncio.run(backend.save_stream("big.bin", chunks_of(b"ab", b"cd", b"ef")))
+
+    assert client.calls[-1] == "abort_multipart_upload"
+    assert client.uploads == {}
+    assert "big.bin" not in client.objects
+
+
+def test_s3_exists_delete_and_list_keys_strip_prefix():
+    client = FakeS3Client()
+    backend = s3_storage(client, prefix="p/")
+    for key in ("a/1", "a/2", "a/3", "b/1"):
+        asyncio.run(backend.save_stream(key, chunks_of(b"x")))
+
+    assert asyncio.run(backend.exists("a/1"))
+    assert asyncio.run(list_all(backend, "a/")) == ["a/1", "a/2", "a/3"]
+    asyncio.run(backend.delete("a/1"))
+    assert not asyncio.run(backend.exists("a/1"))
+
+
+def test_s3_read_url_prefers_public_url():
+    assert asyncio.run(s3_storage(FakeS3Client(), public_url="https://cdn.example/").read_url("a.png")) == \
+        "https://cdn.example/a.png"
+    presigned = asyncio.run(s3_storage(FakeS3Client(), presign_seconds=60).read_url("a.png"))
+    assert presigned == "https://signed.example/a.png?method=get_object&expires=60"
+
+
+def test_local_storage_round_trip(tmp_path):
+    backend = LocalStorage(tmp_path)
+
+    assert asyncio.run(backend.save_stream("dir/a.txt", chunks_of(b"he", b"llo"))) == 5
+    assert asyncio.run(read_all(backend, "dir/a.txt")) == b"hello"
+    assert asyncio.run(list_all(backend)) == ["dir/a.txt"]
+    asyncio.run(backend.delete("dir/a.txt"))
+    assert not asyncio.run(backend.exists("dir/a.txt"))
+
+
+def test_local_storage_rejects_keys_outside_root(tmp_path):
+    with pytest.raises(ValueError):
+        LocalStorage(tmp_path).path("../escape.txt")
+
+
+def upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="a.png")
+
+
+def test_upload_within_limit_is_stored(tmp_path, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 3 * 1024 * 1024)
+    backend = LocalStorage(tmp_path)
+    data = b"x" * (2 * 1024 * 1024 + 5)
+
+    assert asyncio.run(backend.save_stream("a.png", server.read_upload_chunks(upload(data)))) == len(data)
+    assert asyncio.run(read_all(backend, "a.png")) == data
+
+
+def test_oversized_upload_is_rejected_mid_stream(tmp_path, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 2 * 1024 * 1024)
+    backend = LocalStorage(tmp_path)
+    file = upload(b"x" * (4 * 1024 * 1024))
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(backend.save_stream("a.png", server.read_upload_chunks(file)))
+
+    assert raised.value.status_code == 400
+    # Reading stopped at the first chunk over the limit, and nothing was left behind
+    assert file.file.tell() == 3 * 1024 * 1024
+    assert list(tmp_path.rglob("*")) == []
+
+
+def test_oversized_upload_aborts_s3_multipart(monkeypatch):
+    import server
+    monkeypatch.setattr(server, "MAX_UPLOAD_BYTES", 2 * 1024 * 1024)
+    monkeypatch.setattr(storage, "S3_PART_SIZE", 1024 * 1024)
+    client = FakeS3Client()
+    backend = s3_storage(client)
+
+    with pytest.raises(HTTPException):
+        asyncio.run(backend.save_stream("a.png", server.read_upload_chunks(upload(b"x" * (4 * 1024 * 1024)))))
+
+    assert client.calls[-1] == "abort_multipart_upload"
+    assert client.objects == {}